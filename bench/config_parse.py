@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from loguru import logger as log
+from tabulate import tabulate
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from yk import config  # noqa: E402
+
+# config.parse on generated lists, time and memory:
+#   python bench/config_parse.py -n 1000 10000 50000
+
+
+def make_list(path: Path, n: int):
+    lines = ["quality = 'best'", "folder = 'bench'", '']
+
+    for i in range(n):
+        match i % 3:
+            case 0:
+                lines += [f"['https://www.youtube.com/channel/UC{i:022d}']", '']
+            case 1:
+                lines += [
+                    f"['ch{i}']",
+                    f"u = 'https://twitch.tv/ch{i}'",
+                    "q = '720p'",
+                    '',
+                ]
+            case 2:
+                lines += [
+                    f"['https://www.youtube.com/@ch{i}']",
+                    "regex = 'karaoke'",
+                    '',
+                ]
+
+    path.write_text('\n'.join(lines), encoding='utf-8')
+
+
+def args(output: str):
+    return argparse.Namespace(
+        quality='best',
+        output=output,
+        apprise='',
+        cookies='',
+        bgutil='',
+        proxy=[''],
+        delay=60,
+        max_delay=900,
+        chk='dlp',
+        rec='dlp',
+        str_args='',
+        dlp_args='',
+        yta_args='',
+    )
+
+
+def best(fn, runs: int):
+    times = []
+    for _ in range(runs):
+        gc.collect()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+
+    return f'{min(times) * 1000:.1f}'
+
+
+def run(n: int, runs: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'list.toml'
+        make_list(path, n)
+        ns = args(str(Path(tmp) / 'out'))
+
+        def cold():
+            # caches of the current version, if any
+            getattr(config, 'parsed', {}).clear()
+            for fn in ['valid_url', 'resolve', 'compile_regex']:
+                if hasattr(config, fn):
+                    getattr(config, fn).cache_clear()
+
+            return config.parse([str(path)], ns)
+
+        def warm():
+            return config.parse([str(path)], ns)
+
+        edits = iter(range(runs))
+
+        def edited():
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f"\n['https://twitch.tv/edited{next(edits)}']\n")
+            return config.parse([str(path)], ns)
+
+        row = [n, best(cold, runs), best(warm, runs), best(edited, runs)]
+
+        # memory held by the parsed channels (and parse caches)
+        gc.collect()
+        tracemalloc.start()
+        r = cold()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return row + [f'{size / 2**20:.1f}', size // len(r)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        '-n',
+        type=int,
+        nargs='+',
+        default=[1000, 10000, 50000],
+        help='entries in the list',
+    )
+    ap.add_argument('-r', '--runs', type=int, default=3)
+    a = ap.parse_args()
+
+    log.remove()
+
+    tab = [run(n, a.runs) for n in a.n]
+    print(
+        tabulate(
+            tab,
+            headers=[
+                'channels',
+                'cold ms',
+                'unchanged ms',
+                'edited ms',
+                'MiB',
+                'B/channel',
+            ],
+            tablefmt='plain',
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
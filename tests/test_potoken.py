@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from yk import limit, potoken, supervisor
+
+# potoken cache against a stub bgutil server, tokens live LIFETIME seconds
+# => the timer refreshes used ones after LIFETIME * REFRESH
+
+LIFETIME = 2
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def reply(self, code: int, data: dict):
+        out = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.reply(200, {'server_uptime': 1.0, 'version': '1.0.0'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.requests.append(self.path)
+
+        if self.server.broken:
+            return self.reply(500, {'error': 'broken'})
+
+        expires = datetime.now(timezone.utc) + timedelta(seconds=LIFETIME)
+        self.reply(200, {
+            'poToken': f'token-{self.server.requests.count("/get_pot")}',
+            'expiresAt': expires.isoformat(),
+        })  # fmt: skip
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def bgutil(server, monkeypatch):
+    server.requests = []
+    server.broken = False
+
+    monkeypatch.setitem(limit.RATES, '127.0.0.1', (1000.0, 1000))
+    limit.buckets.clear()
+
+    yield f'http://127.0.0.1:{server.server_port}'
+
+    for timer in potoken.timers.values():
+        supervisor.loop.call_soon_threadsafe(timer.cancel)
+
+    for x in (potoken.tokens, potoken.timers, potoken.stats, potoken.pinged):
+        x.clear()
+
+
+def get(bgutil: str):
+    return supervisor.submit(potoken.get(bgutil)).result(timeout=10)
+
+
+def test_get(bgutil, server):
+    assert get(bgutil) == 'token-1'
+    assert get(bgutil) == 'token-1'  # cached
+
+    assert server.requests == ['/ping', '/get_pot']
+
+    s = potoken.stats[(bgutil, '')]
+    assert (s['hits'], s['misses'], s['requests']) == (1, 1, 1)
+
+
+def test_scheduled_refresh(bgutil, server):
+    get(bgutil)
+    get(bgutil)  # in use
+
+    # refreshed by the timer, before expiry and without a lookup
+    time.sleep(LIFETIME * potoken.REFRESH + 0.5)
+
+    assert server.requests.count('/get_pot') == 2
+    assert potoken.tokens[(bgutil, '')].value == 'token-2'
+    assert get(bgutil) == 'token-2'
+
+
+def test_unused(bgutil, server):
+    get(bgutil)
+
+    # nobody asked for it again => no refresh, it just expires
+    time.sleep(LIFETIME * potoken.REFRESH + 0.5)
+
+    assert server.requests.count('/get_pot') == 1
+    assert (bgutil, '') not in potoken.timers
+
+
+def test_failed(bgutil, server):
+    server.broken = True
+
+    assert get(bgutil) is None
+    assert potoken.stats[(bgutil, '')]['failed'] == 1
+    assert bgutil not in potoken.pinged  # pinged again next time
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+from yk import limit, probe
+from yk.sched import Upcoming
+
+# probe.yt_live against a local stand-in for youtube,
+# '/<fixture>/live' serves a recorded page from fixtures/probe
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'probe'
+ERRORS = {'gone': 404, 'error': 500, 'throttled': 429}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.strip('/').removesuffix('/live')
+        page = FIXTURES / f'{name}.html'
+
+        if name in ERRORS or not page.is_file():
+            code, data = ERRORS.get(name, 404), b'error'
+        else:
+            code, data = 200, page.read_bytes()
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def url(server, monkeypatch):
+    # no waits for rate limit tokens, fresh buckets for throttling checks
+    monkeypatch.setitem(limit.RATES, '127.0.0.1', (1000.0, 1000))
+    limit.buckets.clear()
+
+    return lambda name: f'http://127.0.0.1:{server.server_port}/{name}/live'
+
+
+def test_offline(url):
+    assert probe.yt_live(url('offline')) is False
+
+
+def test_live(url):
+    r = probe.yt_live(url('live'))
+    assert r == 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    assert probe.video_id(r) == 'dQw4w9WgXcQ'
+
+
+def test_upcoming(url):
+    r = probe.yt_live(url('upcoming'))
+    assert r == Upcoming('https://www.youtube.com/watch?v=9bZkp7q19f0', 1792346400)
+    assert not r  # falsy, still offline for checkers
+
+
+def test_ended(url):
+    # canonical video without live markers => full extraction decides
+    assert probe.yt_live(url('ended')) is None
+
+
+def test_consent(url):
+    assert probe.yt_live(url('consent')) is None
+
+
+@pytest.mark.parametrize('name', ['gone', 'error'])
+def test_http_error(url, name):
+    assert probe.yt_live(url(name)) is None
+
+
+def test_throttled(url):
+    assert probe.yt_live(url('throttled')) is None
+    assert limit.bucket(url('throttled')).throttled == 1
+
+
+def test_proxy_error(url):
+    # dead proxy is a failed check, not an offline channel
+    with pytest.raises(requests.RequestException):
+        probe.yt_live(url('offline'), proxy='http://127.0.0.1:1', timeout=5)
+
+
+def test_video_id():
+    assert probe.video_id('https://www.youtube.com/watch?v=dQw4w9WgXcQ') == (
+        'dQw4w9WgXcQ'
+    )
+    assert probe.video_id('https://www.youtube.com/@channel') is None
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import importlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+
+from yk import push
+
+# callback server end-to-end: websub against a stub hub (YK_WEBSUB_HUB)
+# that verifies the subscription and posts a signed feed, eventsub messages
+
+SECRET = 'hunter2'
+CHANNEL_ID = 'UCO_aKKYxn4tvrqPjcTzZ6EQ'
+
+FEED = f"""<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <link rel="hub" href="https://pubsubhubbub.appspot.com"/>
+  <title>YouTube video feed</title>
+  <entry>
+    <id>yt:video:dQw4w9WgXcQ</id>
+    <yt:videoId>dQw4w9WgXcQ</yt:videoId>
+    <yt:channelId>{CHANNEL_ID}</yt:channelId>
+    <title>live soon</title>
+  </entry>
+</feed>
+"""  # noqa: E501
+
+
+class Hub(BaseHTTPRequestHandler):
+    # subscribe => async GET verification => signed feed on success
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        q = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        self.server.subscriptions.append(q)
+
+        self.send_response(202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+        threading.Thread(target=self.server.deliver, args=(q,)).start()
+
+
+class HubServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Hub)
+        self.subscriptions = []
+        self.verified = threading.Event()
+        self.delivered = threading.Event()
+
+    def deliver(self, q: dict):
+        r = requests.get(
+            q['hub.callback'],
+            params={
+                'hub.mode': q['hub.mode'],
+                'hub.topic': q['hub.topic'],
+                'hub.challenge': 'challenge-123',
+                'hub.lease_seconds': q['hub.lease_seconds'],
+            },
+            timeout=5,
+        )
+        if r.status_code != 200 or r.text != 'challenge-123':
+            return
+
+        self.verified.set()
+
+        body = FEED.encode()
+        mac = hmac.new(q['hub.secret'].encode(), body, hashlib.sha1).hexdigest()
+        requests.post(
+            q['hub.callback'],
+            data=body,
+            headers={'X-Hub-Signature': f'sha1={mac}'},
+            timeout=5,
+        )
+        self.delivered.set()
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    srv = HubServer()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv('YK_WEBSUB_HUB', f'http://127.0.0.1:{srv.server_port}/subscribe')
+    importlib.reload(push)
+
+    yield srv
+
+    srv.shutdown()
+    srv.server_close()
+    monkeypatch.undo()
+    importlib.reload(push)
+
+
+def server(secret: str = SECRET):
+    srv = push.Server(0, secret=secret)
+    srv.url = f'http://127.0.0.1:{srv.server_port}'
+    srv.start()
+    return srv
+
+
+@pytest.fixture
+def srv():
+    srv = server()
+    yield srv
+    srv.stop()
+
+
+def wait_for(fn, timeout: float = 5):
+    end = time.monotonic() + timeout
+    while not fn() and time.monotonic() < end:
+        time.sleep(0.02)
+
+    return fn()
+
+
+def test_websub(hub, srv):
+    srv.websub_sync({CHANNEL_ID})
+
+    assert hub.verified.wait(5)
+    assert hub.delivered.wait(5)
+
+    q = hub.subscriptions[0]
+    assert q['hub.topic'] == push.TOPIC % CHANNEL_ID
+    assert q['hub.callback'] == f'{srv.url}/websub'
+
+    ch = ('yt', CHANNEL_ID)
+    assert srv.active(ch)
+    assert wait_for(lambda: not srv.events.empty())
+    assert srv.drain() == {ch}
+
+
+def test_websub_unrequested(srv):
+    # verification nobody asked for => no subscription
+    r = requests.get(
+        f'{srv.url}/websub',
+        params={
+            'hub.mode': 'subscribe',
+            'hub.topic': push.TOPIC % CHANNEL_ID,
+            'hub.challenge': 'x',
+        },
+        timeout=5,
+    )
+
+    assert r.status_code == 404
+    assert not srv.active(('yt', CHANNEL_ID))
+
+
+def test_websub_bad_signature(srv):
+    r = requests.post(
+        f'{srv.url}/websub',
+        data=FEED.encode(),
+        headers={'X-Hub-Signature': 'sha1=0000'},
+        timeout=5,
+    )
+
+    assert r.status_code == 403
+    assert srv.drain() == set()
+
+
+def eventsub(srv, secret: str = SECRET, kind: str = 'notification', **data):
+    body = json.dumps({
+        'subscription': {
+            'type': 'stream.online',
+            'condition': {'broadcaster_user_login': 'someone'},
+        },
+        **data,
+    }).encode()  # fmt: skip
+
+    msg_id, ts = 'msg-1', '2026-10-18T17:00:00Z'
+    mac = hmac.new(
+        secret.encode(), msg_id.encode() + ts.encode() + body, hashlib.sha256
+    )
+
+    return requests.post(
+        f'{srv.url}/eventsub',
+        data=body,
+        headers={
+            'Twitch-Eventsub-Message-Id': msg_id,
+            'Twitch-Eventsub-Message-Timestamp': ts,
+            'Twitch-Eventsub-Message-Signature': f'sha256={mac.hexdigest()}',
+            'Twitch-Eventsub-Message-Type': kind,
+        },
+        timeout=5,
+    )
+
+
+def test_eventsub(srv):
+    r = eventsub(srv, kind='webhook_callback_verification', challenge='abc')
+    assert r.status_code == 200
+    assert r.text == 'abc'
+    assert srv.active(('tw', 'someone'))
+
+    r = eventsub(srv, event={'broadcaster_user_login': 'someone'})
+    assert r.status_code == 204
+    assert srv.drain() == {('tw', 'someone')}
+
+
+def test_eventsub_bad_signature(srv):
+    r = eventsub(srv, secret='wrong', kind='webhook_callback_verification')
+
+    assert r.status_code == 403
+    assert not srv.active(('tw', 'someone'))
+
+
+def test_eventsub_without_secret():
+    srv = server(secret='')
+    try:
+        r = eventsub(srv, kind='webhook_callback_verification', challenge='abc')
+
+        assert r.status_code == 403
+        assert not srv.active(('tw', 'someone'))
+    finally:
+        srv.stop()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import importlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from yk import limit, sched, twitch
+
+# batched 'twb' checker against a stub gql server (YK_TWITCH_GQL)
+
+STREAMS = {
+    'live1': {'id': '101', 'title': 'live', 'type': 'live', 'createdAt': ''},
+    'live2': {'id': '102', 'title': 'live', 'type': 'live', 'createdAt': ''},
+    'offline': None,
+}
+BANNED = 'banned'  # users(...) has null for banned / renamed users
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        logins = body['variables']['logins']
+        self.server.requests.append((self.headers.get('Client-ID'), logins))
+
+        if self.server.status != 200:
+            data = {}
+        elif self.server.errors:
+            data = {'errors': [{'message': 'service error'}]}
+        else:
+            users = [
+                None if x == BANNED else {'login': x, 'stream': STREAMS.get(x)}
+                for x in logins
+            ]
+            data = {'data': {'users': users}}
+
+        out = json.dumps(data).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def gql(server, monkeypatch):
+    server.requests = []
+    server.status = 200
+    server.errors = False
+
+    monkeypatch.setenv('YK_TWITCH_GQL', f'http://127.0.0.1:{server.server_port}/gql')
+    monkeypatch.setitem(limit.RATES, '127.0.0.1', (1000.0, 1000))
+    limit.buckets.clear()
+
+    importlib.reload(twitch)
+    yield server
+    monkeypatch.undo()
+    importlib.reload(twitch)
+
+
+def test_login():
+    assert twitch.login('https://www.twitch.tv/Some_User') == 'some_user'
+    assert twitch.login('https://twitch.tv/someone/videos') is None
+    assert twitch.login('https://www.youtube.com/@someone') is None
+
+
+def test_is_live(gql):
+    streams = twitch.is_live(['live1', 'offline', BANNED, 'unknown'])
+
+    assert streams['live1']['id'] == '101'
+    assert streams['offline'] is None
+    assert streams[BANNED] is None
+    assert streams['unknown'] is None
+
+    assert gql.requests == [(twitch.CLIENT_ID, ['live1', 'offline', BANNED, 'unknown'])]
+
+
+def test_batches(gql, monkeypatch):
+    monkeypatch.setattr(twitch, 'BATCH', 2)
+    streams = twitch.is_live(['live1', 'offline', 'live2'])
+
+    assert [logins for _, logins in gql.requests] == [['live1', 'offline'], ['live2']]
+    assert streams['live2']['id'] == '102'
+
+
+def test_gql_errors(gql):
+    gql.errors = True
+    with pytest.raises(ValueError):
+        twitch.is_live(['live1'])
+
+
+def test_throttled(gql):
+    gql.status = 429
+    with pytest.raises(requests.HTTPError):
+        twitch.is_live(['live1'])
+
+    assert limit.bucket(twitch.GQL).throttled == 1
+
+
+def test_shared_tick():
+    # different intervals, still due at the same time => one request
+    q = sched.Scheduler()
+    urls = [f'https://www.twitch.tv/user{i}' for i in range(20)]
+
+    for i, url in enumerate(urls):
+        q.add(url, 60 + i // 2, 600, batched=True)
+
+    assert q.pop_due() == urls  # first round: everything right away
+
+    for url in urls:
+        q.done(url, False)
+
+    dues = {q.state[url]['due'] for url in urls}
+    assert all(due % sched.TICK == 0 for due in dues)
+    assert len(dues) <= 2
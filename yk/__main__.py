@@ -8,7 +8,7 @@ from pathlib import Path
 from loguru import logger as log
 from tabulate import tabulate
 
-from . import util
+from . import predict, util
 from .serve import main as loop_main
 
 try:
@@ -87,25 +87,45 @@ def main():
     ADD('-i', '--input',   nargs='+', default=SENV('YK_INPUT', ''),      help='lists with channels (.toml)') 
     ADD('-o', '--output',  type=str,  default=ENV("YK_OUTPUT", ''),      help='output folder')
     ADD('-l', '--log',     type=str,  default=ENV("YK_LOG", 'DISABLED'), help='log to file (path to folder / file)')
-    ADD('-d', '--delay',   type=int,  default=ENV("YK_DELAY", 60),       help='delay beetwen checks (default: 60)')
+    ADD('-d', '--delay',   type=int,  default=ENV("YK_DELAY", 60),       help='delay beetwen checks of one channel (default: 60)')
+    ADD('--max-delay',     type=int,  default=ENV("YK_MAX_DELAY", 900),  help='max delay for long-offline channels (default: 900)')
+    ADD('--lead-time',     type=int,  default=ENV("YK_LEAD_TIME", 120),  help='start recorder N seconds before scheduled streams (default: 120)')
+    ADD('-w', '--check-workers', type=int, default=ENV("YK_CHECK_WORKERS", 4), help='parallel live-checks (default: 4)')
+    ADD('--blocking-workers', type=int, default=ENV("YK_BLOCKING_WORKERS", 16), help='threads for blocking work of recordings (default: 16)')
+    ADD('--history',       type=str,  default=ENV("YK_HISTORY", ''),     help='go-live history file (default: output/yk.history.json)')
+    ADD('--post-queue',    type=str,  default=ENV("YK_POST_QUEUE", ''),  help='pending post-processing jobs file (default: output/yk.post.json)')
+    ADD('--post-jobs',     type=str,  default=ENV("YK_POST_JOBS", ''),   help="parallel post-processing per step, 'step=n,...'\n(default: merge=1,chat=2,rename=4)")
+    ADD('--post-nice',     type=int,  default=ENV("YK_POST_NICE", 10),   help='niceness of merges / chat conversions, 0 to disable (default: 10)')
+    ADD('--model',         action='store_true', help='show predicted stream times and exit')
     ADD('--debug',         action='store_true', help='verbose output')
     ADD('--trace',         action='store_true', help='verbosest output')
 
     g = ap.add_argument_group('external tools options')
     ADD = g.add_argument
 
-    ADD("--chk",           type=str,  default='dlp', choices=["str", "dlp"],        help="live-checking method")
+    ADD("--chk",           type=str,  default='dlp', choices=["str", "dlp", "twb"], help="live-checking method")
     ADD("--rec",           type=str,  default='dlp', choices=["str", "dlp", "yta"], help="recording method")
 
+    ADD("--rate",          type=str,  default=ENV("YK_RATE", ''),         help="requests per second per host and proxy, 'host=rate/burst,...'\n(default: youtube.com=1/5,twitch.tv=2/10, others 2/10)")
+    ADD("--extract-jobs",  type=int,  default=ENV("YK_EXTRACT_JOBS", 50), help="recycle warm checkers after N checks (0: new process per check)")
+
     ADD('--str-args',      type=str,  default=ENV("YK_ARGS_STREAMLINK", C_STREAMLINK), help='streamlink cli arguments')
     ADD('--dlp-args',      type=str,  default=ENV("YK_ARGS_YTDLP", C_YTDLP),           help='yt-dlp cli arguments')
     ADD('--yta-args',      type=str,  default=ENV("YK_ARGS_YTARCHIVE", C_YTARCHIVE),   help='ytarchive cli arguments')
 
+    g = ap.add_argument_group('push notifications')
+    ADD = g.add_argument
+
+    ADD('--push-port',     type=int,  default=ENV("YK_PUSH_PORT", 0),        help='callback server port (websub / eventsub), 0 to disable')
+    ADD('--push-url',      type=str,  default=ENV("YK_PUSH_URL", ''),        help='public url of callback server (for websub subscriptions)')
+    ADD('--push-secret',   type=str,  default=ENV("YK_PUSH_SECRET", ''),     help='hmac secret for notifications (required for eventsub)')
+    ADD('--push-interval', type=int,  default=ENV("YK_PUSH_INTERVAL", 1800), help='polling delay for subscribed channels (default: 1800)')
+
     g = ap.add_argument_group('stream options')
     ADD = g.add_argument
 
     ADD('-q', '--quality', type=str,  default=ENV("YK_QUALITY", 'best'), help='recording quality (default: best)')
-    ADD('-p', '--proxy',   nargs='+', default=SENV('YK_PROXY', ''),      help='proxies')
+    ADD('-p', '--proxy',   nargs='+', default=SENV('YK_PROXY', ''),      help='proxies, picked per check / recording by health')
     ADD('-a', '--apprise', type=str,  default=ENV("YK_APPRISE", ''),     help='apprise config (url or .yml file)')
     ADD('-c', '--cookies', type=str,  default=ENV("YK_COOKIES", ''),     help='path to cookies.txt (netscape format)')
     ADD('-b', '--bgutil',  type=str,  default=ENV("YK_BGUTIL", bg),      help='bgutil-ytdlp-pot-provider url')
@@ -147,6 +167,12 @@ def main():
     #########################
     ## envs
 
+    if not args.history:
+        args.history = str(Path(args.output) / 'yk.history.json')
+
+    if not args.post_queue:
+        args.post_queue = str(Path(args.output) / 'yk.post.json')
+
     env_tab = [
         ['YK_ARGS_STREAMLINK', args.str_args],
         ['------------------', ' '],
@@ -160,8 +186,21 @@ def main():
         ['YK_APPRISE', args.apprise],
         ['YK_LOG', args.log],
         ['YK_DELAY', args.delay],
+        ['YK_MAX_DELAY', args.max_delay],
+        ['YK_LEAD_TIME', args.lead_time],
+        ['YK_CHECK_WORKERS', args.check_workers],
+        ['YK_BLOCKING_WORKERS', args.blocking_workers],
+        ['YK_EXTRACT_JOBS', args.extract_jobs],
+        ['YK_RATE', args.rate],
         ['YK_COOKIES', args.cookies],
         ['YK_BGUTIL', args.bgutil],
+        ['YK_HISTORY', args.history],
+        ['YK_POST_QUEUE', args.post_queue],
+        ['YK_POST_JOBS', args.post_jobs],
+        ['YK_POST_NICE', args.post_nice],
+        ['YK_PUSH_PORT', args.push_port],
+        ['YK_PUSH_URL', args.push_url],
+        ['YK_PUSH_INTERVAL', args.push_interval],
     ]
 
     log.debug(
@@ -176,6 +215,10 @@ def main():
         ),
     )
 
+    if args.model:
+        print(predict.Predictor(args.history).show(args.urls))
+        return
+
     pwdir = Path(__file__).resolve().parent
     os.environ['PATH'] = os.pathsep.join([str(pwdir), os.environ['PATH']])
 
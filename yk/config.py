@@ -1,24 +1,87 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
-import random
+import re
+import sys
 import tomllib
-from functools import reduce
+from dataclasses import dataclass, fields
+from functools import cache
 from pathlib import Path
 
 import tomli_w
 from loguru import logger as log
 from validators import url as is_url
 
-from . import util
+from . import twitch, util
+from .watch import signature
 
+CHECKERS = ['str', 'dlp', 'twb']
 
-def parse(i: list = [], args=None, cfg_to_del: dict = {}):
+# file => (signature, args, channels), unchanged lists aren't parsed again
+parsed = {}
+
+
+@dataclass(frozen=True, slots=True)
+class ChannelConfig:
+    url: str
+    quality: str = 'best'
+    output: str = ''
+    folder: str = ''  # subpath (output/folder)
+    delete: bool = False  # remove from list on start
+    health: bool = False  # notify on failed checks, don't record
+    regex_title: re.Pattern | None = None
+    regex_desc: re.Pattern | None = None
+    apprise: str = ''  # apprise url / path to yaml
+    cookies: str = ''  # path to cookies file (netscape format)
+    bgutil: str = ''  # url to potoken server (bgutil compatible)
+    proxy: str = ''  # empty => from '--proxy' pool
+    priority: int = 0
+    min_interval: int = 0
+    max_interval: int = 0
+    checker: str = ''
+    recorder: str = ''
+    arguments: str = ''  # recording tool cli args
+
+
+FIELDS = [x.name for x in fields(ChannelConfig)]
+
+
+@cache
+def valid_url(url: str):
+    return bool(is_url(url))
+
+
+@cache
+def resolve(output: str):
+    # subprocess pwd fix, dirs are created at recording time
+    return str(Path(output).resolve())
+
+
+@cache
+def compile_regex(pattern: str | None):
+    # compiled once per pattern, shared by all channels
+    if not pattern:
+        return None
+
+    try:
+        return re.compile(str(pattern), re.I)
+    except re.error as ex:
+        log.error(f'invalid regex {pattern!r}, {ex}, ignoring')
+        return None
+
+
+def parse(i: list = [], args=None, cfg_to_del: ChannelConfig | None = None):
     o = []
 
     for file in filter(None, i):
         toml = {}
 
+        sig = signature(Path(file))
+        c = parsed.get(file)
+        if c and sig and not cfg_to_del and c[0] == sig and c[1] is args:
+            o.append(c[2])
+            continue
+
         #########################
         ## toml validation
 
@@ -28,7 +91,7 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                     toml = tomllib.load(f)
                     assert toml
 
-            elif is_url(file):
+            elif valid_url(file):
                 toml = {file: {}}
 
             else:
@@ -51,8 +114,6 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
             log.error(f'file error in {file!r}, {ex}')
             continue
 
-        abbrs = ['u', 'f', 'r', 'q', 'd', 'h', 'o', 'chk', 'rec']
-
         # defaults
         _quality = args.quality
         _output = args.output
@@ -64,7 +125,12 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
         _apprise = args.apprise
         _cookies = args.cookies
         _bgutil = args.bgutil
-        _proxy = random.choice(args.proxy) if args.proxy else ''
+        _proxy = ''  # => per check / recording from '--proxy' pool
+
+        _priority = 0
+
+        _min_interval = args.delay
+        _max_interval = args.max_delay
 
         _checker = args.chk
         _recorder = args.rec
@@ -75,7 +141,7 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                 # global vars
                 match k:
                     case 'checker' | 'chk':
-                        if v in ['str', 'dlp']:
+                        if v in CHECKERS:
                             _checker = v
                     case 'recorder' | 'rec':
                         if v in ['str', 'dlp', 'yta']:
@@ -104,6 +170,12 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                         _proxy = str(v)
                     case 'arguments' | 'args':
                         _arguments = str(v)
+                    case 'priority':
+                        _priority = int(v)
+                    case 'min_interval':
+                        _min_interval = int(v)
+                    case 'max_interval':
+                        _max_interval = int(v)
                     case _:
                         log.warning(f'{file}: invalid global value: {k} = {v}')
 
@@ -113,16 +185,16 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
             if v.get('url') or v.get('u'):
                 continue
 
-            if is_url(k):
+            if valid_url(k):
                 # key is url
                 toml[k]['url'] = k
 
-            elif is_url(k.removeprefix('!')):
+            elif valid_url(k.removeprefix('!')):
                 # !url => remove == True
                 toml[k]['delete'] = True
                 toml[k]['url'] = k.removeprefix('!')
 
-            elif is_url(k.removeprefix('@')):
+            elif valid_url(k.removeprefix('@')):
                 # @url => health == True
                 toml[k]['health'] = True
                 toml[k]['url'] = k.removeprefix('@')
@@ -134,24 +206,38 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
             # basic options
             toml[k]['url'] = v.get('url') or v.get('u') or ''
 
-            toml[k]['quality'] = v.get('quality') or v.get('q') or _quality
-            toml[k]['output'] = v.get('output') or v.get('o') or _output
-            toml[k]['folder'] = v.get('folder') or v.get('f') or _folder
+            toml[k]['quality'] = str(v.get('quality') or v.get('q') or _quality)
+            toml[k]['output'] = resolve(str(v.get('output') or v.get('o') or _output))
+            toml[k]['folder'] = str(v.get('folder') or v.get('f') or _folder)
             toml[k]['delete'] = bool(v.get('delete') or v.get('d') or False)
             toml[k]['health'] = bool(v.get('health') or v.get('h') or _health)
 
             rgx = v.get('regex') or v.get('r') or _regex
-            toml[k]['regex_title'] = v.get('regex_title') or _regex_title or rgx
-            toml[k]['regex_desc'] = v.get('regex_desc') or _regex_desc or rgx
+            toml[k]['regex_title'] = compile_regex(
+                v.get('regex_title') or _regex_title or rgx
+            )
+            toml[k]['regex_desc'] = compile_regex(
+                v.get('regex_desc') or _regex_desc or rgx
+            )
 
             toml[k]['apprise'] = v.get('apprise') or _apprise
             toml[k]['cookies'] = v.get('cookies') or _cookies
             toml[k]['bgutil'] = v.get('bgutil') or _bgutil
             toml[k]['proxy'] = v.get('proxy') or _proxy
 
+            # duplicate broadcasts (collabs, watch?v= + channel urls)
+            toml[k]['priority'] = int(v.get('priority') or _priority)
+
+            # polling intervals (seconds)
+            toml[k]['min_interval'] = int(v.get('min_interval') or _min_interval)
+            toml[k]['max_interval'] = max(
+                int(v.get('max_interval') or _max_interval),
+                toml[k]['min_interval'],
+            )
+
             # live-stream checking method
             toml[k]['checker'] = v.get('checker') or v.get('chk') or ''
-            if toml[k]['checker'] not in ['str', 'dlp']:
+            if toml[k]['checker'] not in CHECKERS:
                 toml[k]['checker'] = _checker
 
             # recording method
@@ -164,7 +250,7 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                 toml.pop(k)
                 continue
 
-            if not is_url(toml[k]['url']):
+            if not valid_url(toml[k]['url']):
                 log.warning(
                     f'{file}: {k}: {toml[k]["url"]!r} is not a valid url, skipping.',
                 )
@@ -173,6 +259,14 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
 
             is_yt = util.con(['youtube.com', 'youtu.be'], toml[k]['url'])
 
+            # batched checker works only with twitch channels
+            if toml[k]['checker'] == 'twb' and not twitch.login(toml[k]['url']):
+                log.warning(
+                    f'{file}: {k}: checking method is twb, but non-twitch url detected ({toml[k]["url"]}), will fallback to yt-dlp',
+                    item=toml[k],
+                )
+                toml[k]['checker'] = 'dlp'
+
             # check for ytarchive recorder in non-youtube streams
             if toml[k]['recorder'] == 'yta' and not is_yt:
                 log.warning(
@@ -210,21 +304,14 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                 log.info(f'choose something from {", ".join(util.YTA_Q)!r}')
                 toml[k]['quality'] = 'best'
 
-            try:
-                out_path = Path(toml[k]['output'])
-                out_path.mkdir(parents=True, exist_ok=True)
-                toml[k]['output'] = str(out_path.resolve())  # subprocess pwd fix
-            except:  # noqa: E722
-                log.exception(
-                    f'{file}: {k}: failed to create output dir: {toml[k]["output"]}'
-                )
-                continue
-
-            for i in abbrs:
-                if i in v:
-                    del toml[k][i]
-
-            toml[k] = dict(sorted(toml[k].items()))
+            # shared strings are stored once, unknown keys are dropped
+            toml[k] = ChannelConfig(
+                **{
+                    f: sys.intern(x) if isinstance(x, str) else x
+                    for f in FIELDS
+                    if (x := toml[k][f]) is not None
+                }
+            )
 
         #########################
         ## deleting single-use items
@@ -240,7 +327,7 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                 if k not in toml:
                     continue
 
-                if toml[k]['delete'] and toml[k]['url'] == cfg_to_del.get('url'):
+                if toml[k].delete and toml[k].url == cfg_to_del.url:
                     toml_or.pop(k)
 
                     path = Path(file)
@@ -257,12 +344,32 @@ def parse(i: list = [], args=None, cfg_to_del: dict = {}):
                     log.warning(f'removed {k!r}')
                     break
 
-        log.trace(f'{file}:\n' + util.pf(toml))
+        log.opt(lazy=True).trace('{}:\n{}', lambda: file, lambda: util.pf(toml))
+
+        if sig and not cfg_to_del:
+            parsed[file] = (sig, args, toml)
 
         o.append(toml)
 
     if not o:
         return o
 
-    # merge dicts
-    return reduce(lambda x, y: x | y, o)
+    return merge(o)
+
+
+def merge(lists: list):
+    # later lists override earlier ones
+    r = {}
+    for x in lists:
+        r.update(x)
+
+    return r
+
+
+def diff(old: dict, new: dict):
+    # {url: (ch, cfg)} => ([added], [removed], [changed]) urls
+    added = [url for url in new if url not in old]
+    removed = [url for url in old if url not in new]
+    changed = [url for url in new if url in old and new[url] != old[url]]
+
+    return added, removed, changed
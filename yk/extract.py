@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import multiprocessing as mp
+import queue
+import signal
+import threading
+from functools import cache
+from http.cookiejar import MozillaCookieJar
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+
+from loguru import logger as log
+
+from .info import project
+
+# long-lived yt-dlp / streamlink workers, so checks don't pay
+# interpreter startup and extractor imports every time
+
+MODULES = {'dlp': 'yt_dlp', 'str': 'streamlink'}
+CTX = mp.get_context('spawn')
+
+pools = {}
+pools_lock = threading.Lock()
+
+size = 0  # max workers per method
+jobs = 0  # checks before recycling a worker (0 = disabled)
+
+
+class _Log:
+    # collects yt-dlp output instead of printing it
+
+    def __init__(self):
+        self.lines = []
+
+    def debug(self, msg):
+        self.lines.append(msg)
+
+    info = warning = error = debug
+
+
+def _dlp_session(proxy: str, cookies: str):
+    from yt_dlp import YoutubeDL
+
+    params = {
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'playlist_items': '1',
+        'remote_components': ['ejs:github'],
+        'ignore_no_formats_error': True,  # upcoming streams
+        'logger': _Log(),
+    }
+
+    if proxy:
+        params['proxy'] = proxy
+
+    if Path(cookies).is_file():
+        params['cookiefile'] = cookies
+
+    return YoutubeDL(params)
+
+
+def _dlp_check(ydl, url: str):
+    from yt_dlp.utils import DownloadError
+
+    logger = ydl.params['logger']
+    logger.lines.clear()
+
+    try:
+        info = ydl.extract_info(url, download=False)
+    except DownloadError:
+        return {'online': False, 'info': {}, 'log': '\n'.join(logger.lines)}
+
+    # full '--dump-json' document only for live ones, it ends up in .info
+    online = bool(info.get('is_live'))
+
+    return {
+        'online': online,
+        'info': ydl.sanitize_info(info) if online else project(info),
+        'log': '\n'.join(logger.lines),
+    }
+
+
+def _str_session(proxy: str, cookies: str):
+    from streamlink import Streamlink
+
+    session = Streamlink()
+
+    if proxy:
+        session.set_option('http-proxy', proxy)
+
+    if Path(cookies).is_file():
+        cj = MozillaCookieJar(cookies)
+        cj.load()
+        session.http.cookies.update(cj)
+
+    return session
+
+
+def _str_check(session, url: str):
+    from streamlink import PluginError
+
+    try:
+        streams = session.streams(url)
+    except PluginError as ex:
+        return {'online': False, 'info': {}, 'log': str(ex)}
+
+    return {'online': bool(streams), 'info': {}, 'log': ', '.join(streams)}
+
+
+SESSIONS = {'dlp': _dlp_session, 'str': _str_session}
+CHECKS = {'dlp': _dlp_check, 'str': _str_check}
+
+
+def _worker(conn, kind: str, jobs: int):
+    # ctrl+c is handled by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import_module(MODULES[kind])
+    sessions = {}
+
+    for _ in range(jobs):
+        try:
+            url, proxy, cookies = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            if (proxy, cookies) not in sessions:
+                if len(sessions) > 8:
+                    sessions.clear()
+                sessions[proxy, cookies] = SESSIONS[kind](proxy, cookies)
+
+            r = CHECKS[kind](sessions[proxy, cookies], url)
+        except Exception as ex:
+            r = {'online': None, 'info': {}, 'log': repr(ex)}
+
+        conn.send(r)
+
+
+class Worker:
+    def __init__(self, kind: str, jobs: int):
+        self.conn, child = CTX.Pipe()
+        self.left = jobs
+        self.proc = CTX.Process(
+            target=_worker,
+            args=(child, kind, jobs),
+            name=f'yk-{kind}',
+            daemon=True,
+        )
+        self.proc.start()
+        child.close()
+
+        log.trace('warm worker started', kind=kind, pid=self.proc.pid)
+
+    def stop(self, kill: bool = False):
+        self.conn.close()
+
+        if kill:
+            self.proc.kill()
+
+        self.proc.join(5)
+
+
+class Pool:
+    def __init__(self, kind: str, size: int, jobs: int, timeout: int = 180):
+        self.kind = kind
+        self.jobs = jobs
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def check(self, url: str, proxy: str = '', cookies: str = ''):
+        with self.slots:
+            try:
+                w = self.idle.get_nowait()
+            except queue.Empty:
+                w = Worker(self.kind, self.jobs)
+
+            try:
+                w.conn.send((url, proxy, cookies))
+
+                if not w.conn.poll(self.timeout):
+                    raise TimeoutError(f'no answer in {self.timeout}s')
+
+                r = w.conn.recv()
+
+            except (EOFError, OSError, TimeoutError) as ex:
+                # crashed or hung worker, next check spawns a new one
+                log.warning(f'warm {self.kind} worker died: {ex!r}', url=url)
+                w.stop(kill=True)
+                return None
+
+            w.left -= 1
+            if w.left > 0:
+                self.idle.put(w)
+            else:
+                w.stop()
+
+            return r
+
+
+def setup(workers: int, recycle: int):
+    global size, jobs
+
+    size = max(1, workers)
+    jobs = max(0, recycle)
+
+
+@cache
+def installed(kind: str):
+    return find_spec(MODULES[kind]) is not None
+
+
+def available(kind: str):
+    return bool(jobs) and installed(kind)
+
+
+def check(kind: str, url: str, proxy: str = '', cookies: str = ''):
+    # None => no warm workers, use a subprocess instead
+    if not available(kind):
+        return None
+
+    with pools_lock:
+        if kind not in pools:
+            pools[kind] = Pool(kind, size, jobs)
+
+    return pools[kind].check(url, proxy, cookies)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from dataclasses import asdict, dataclass, fields
+
+# the only yt-dlp fields yk reads, checkers request them via '--print' template
+# instead of the whole '--dump-json' document (formats list etc.),
+# record.get_info keeps the full document for .info files
+
+
+@dataclass(slots=True)
+class StreamInfo:
+    id: str = ''
+    title: str = ''
+    fulltitle: str = ''
+    description: str = ''
+    uploader: str = ''
+    extractor: str = ''
+    webpage_url: str = ''
+    webpage_url_basename: str = ''
+    is_live: bool = False
+    live_status: str = ''
+    release_timestamp: int = 0
+    timestamp: int = 0
+    epoch: int = 0
+
+    @classmethod
+    def parse(cls, d: dict):
+        return cls(**project(d))
+
+    def dict(self):
+        return asdict(self)
+
+
+FIELDS = [x.name for x in fields(StreamInfo)]
+TEMPLATE = '%(.{' + ','.join(FIELDS) + '})j'
+
+
+def project(d: dict):
+    # None values are dropped, so defaults stay
+    return {k: d[k] for k in FIELDS if d.get(k) is not None}
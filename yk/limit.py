@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+from loguru import logger as log
+from tabulate import tabulate
+
+# token buckets per (host, proxy), shared by checkers, recorders and helpers,
+# so one big list can't get every channel behind a proxy throttled;
+# checkers don't wait for tokens, they are scheduled again (Later)
+
+RATES = {
+    'youtube.com': (1.0, 5),  # requests per second, burst
+    'youtu.be': (1.0, 5),
+    'ytimg.com': (2.0, 10),
+    'twitch.tv': (2.0, 10),
+}
+DEFAULT = (2.0, 10)
+
+SLOWDOWN = 0.5  # rate multiplier for every throttled response
+FLOOR = 1 / 16  # lowest multiplier
+COOLDOWN = 600  # seconds without throttling to double the rate back
+
+buckets = {}
+buckets_lock = threading.Lock()
+
+
+def host(url: str):
+    # => 'youtube.com' for 'https://www.youtube.com/...'
+    h = urlparse(url if '//' in url else f'//{url}').hostname or ''
+
+    if h.replace('.', '').isdigit():
+        return h  # ip
+
+    return '.'.join(h.split('.')[-2:])
+
+
+class Bucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.factor = 1.0  # < 1 after throttling
+        self.calm = 0.0  # monotonic time of the next rate recovery
+
+        self.queue = 0.0  # monotonic time when deferred callers are done
+        self.requests = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.deferred = 0
+
+    def refill(self, now: float):
+        # => current rate, under lock
+        if self.factor < 1 and now > self.calm:
+            self.factor = min(self.factor * 2, 1.0)
+            self.calm = now + COOLDOWN
+
+        rate = self.rate * self.factor
+        self.tokens = min(self.tokens + (now - self.ts) * rate, self.burst)
+        self.ts = now
+
+        return rate
+
+    def reserve(self):
+        # => seconds to wait for the reserved token
+        with self.lock:
+            now = time.monotonic()
+            rate = self.refill(now)
+
+            # reserve a token, negative balance => queue
+            self.tokens -= 1
+            delay = max(-self.tokens / rate, 0)
+
+            self.requests += 1
+            self.waited += delay
+            self.max_wait = max(self.max_wait, delay)
+
+        return delay
+
+    def take(self):
+        # => 0 if a token is taken, else seconds to come back after,
+        # nothing is reserved: deferred callers are spread one token apart
+        with self.lock:
+            now = time.monotonic()
+            rate = self.refill(now)
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.requests += 1
+                return 0
+
+            at = max(now + (1 - self.tokens) / rate, self.queue)
+            self.queue = at + 1 / rate
+            self.deferred += 1
+
+            return at - now
+
+    def acquire(self):
+        # => seconds waited for a token
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+        return delay
+
+    def slowdown(self):
+        with self.lock:
+            self.factor = max(self.factor * SLOWDOWN, FLOOR)
+            self.calm = time.monotonic() + COOLDOWN
+            self.throttled += 1
+
+
+def setup(rates: str = ''):
+    # 'youtube.com=1/5,twitch.tv=2' => RATES
+    for item in filter(None, rates.replace(' ', ',').split(',')):
+        try:
+            h, v = item.split('=')
+            rate, _, burst = v.partition('/')
+            RATES[host(h)] = (float(rate), int(burst or max(float(rate), 1)))
+        except ValueError:
+            log.error(f'invalid rate limit: {item!r}, expected host=rate/burst')
+
+    with buckets_lock:
+        buckets.clear()
+
+
+def bucket(url: str, proxy: str = ''):
+    h = host(url)
+
+    with buckets_lock:
+        if (h, proxy) not in buckets:
+            buckets[h, proxy] = Bucket(*RATES.get(h, DEFAULT))
+
+        return buckets[h, proxy]
+
+
+class Later(Exception):
+    # no token for a check right now, schedule it again in .delay seconds
+    def __init__(self, url: str, delay: float):
+        super().__init__(f'no token for {host(url)}, {delay:.1f}s')
+        self.delay = delay
+
+
+def take(url: str, proxy: str = ''):
+    # acquire() for check workers: raises Later instead of sleeping
+    delay = bucket(url, proxy).take()
+    if delay:
+        raise Later(url, delay)
+
+
+def acquire(url: str, proxy: str = ''):
+    delay = bucket(url, proxy).acquire()
+
+    if delay > 1:
+        log.debug(f'rate limit: waited {delay:.1f}s for {host(url)}', proxy=proxy)
+
+    return delay
+
+
+async def wait(url: str, proxy: str = ''):
+    # acquire() for the supervisor loop
+    delay = bucket(url, proxy).reserve()
+    if delay:
+        await asyncio.sleep(delay)
+
+    if delay > 1:
+        log.debug(f'rate limit: waited {delay:.1f}s for {host(url)}', proxy=proxy)
+
+    return delay
+
+
+def throttled(url: str, proxy: str = ''):
+    # 429 / 'Sign in to confirm' => slow down this (host, proxy)
+    b = bucket(url, proxy)
+    b.slowdown()
+
+    log.warning(
+        f'throttled by {host(url)}, slowing down to {b.rate * b.factor:.2f} req/s',
+        proxy=proxy,
+    )
+
+
+def show():
+    with buckets_lock:
+        items = sorted(buckets.items())
+
+    tab = [
+        [
+            h,
+            p or '-',
+            f'{b.rate * b.factor:.2f}/{b.burst}',
+            b.requests,
+            f'{b.waited / (b.requests or 1):.2f}',
+            f'{b.max_wait:.1f}',
+            b.deferred,
+            b.throttled,
+        ]
+        for (h, p), b in items
+    ]
+
+    return tabulate(
+        tab,
+        headers=[
+            'host',
+            'proxy',
+            'rate',
+            'requests',
+            'avg wait',
+            'max',
+            'deferred',
+            '429',
+        ],  # fmt: skip
+        tablefmt='plain',
+    )
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger as log
+
+from yk import supervisor, util, watch
+
+# apprise notifications from one dispatcher task on the supervisor loop:
+# apprise objects cached per config, bursts sent as digests,
+# optional rate limit per key (e.g. healthchecks of a channel)
+
+QUEUE = 256  # pending notifications, new ones are dropped when full
+WINDOW = 5.0  # seconds to collect a burst into one digest
+TIMEOUT = 60  # seconds for one apprise call
+
+queue: asyncio.Queue | None = None
+task: asyncio.Task | None = None
+
+apobjs = {}  # source => (file signature, Apprise)
+apobjs_lock = threading.Lock()
+
+sent = {}  # rate limit key => monotonic time of the last notification
+sent_lock = threading.Lock()
+
+stats = {'sent': 0, 'digests': 0, 'limited': 0, 'dropped': 0, 'failed': 0}
+
+
+def send(source: str, title: str, body: str, key: str = '', every: float = 0):
+    # from any thread, never blocks
+    if not source:
+        return
+
+    if key and every:
+        now = time.monotonic()
+        with sent_lock:
+            if now - sent.get(key, -every) < every:
+                stats['limited'] += 1
+                log.trace(f'notification limited: {title}', key=key)
+                return
+
+            sent[key] = now
+
+    loop = supervisor.loop or supervisor.start()
+    loop.call_soon_threadsafe(_put, (source, title, body))
+
+
+def _put(item: tuple):
+    global queue, task
+
+    if queue is None:
+        queue = asyncio.Queue(QUEUE)
+        task = asyncio.get_running_loop().create_task(dispatch())
+
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        stats['dropped'] += 1
+        log.warning(f'notification queue is full, dropped: {item[1]}')
+
+
+def apobj(source: str):
+    # => Apprise, built again when the config file changes
+    sig = watch.signature(Path(source))
+
+    with apobjs_lock:
+        cached = apobjs.get(source)
+        if cached and cached[0] == sig:
+            return cached[1]
+
+    obj = util.get_apobj(source)
+
+    with apobjs_lock:
+        apobjs[source] = (sig, obj)
+
+    return obj
+
+
+def tag(title: str):
+    # '[ONLINE] user' => '[ONLINE]'
+    return title.split(']')[0] + ']' if title.startswith('[') else ''
+
+
+async def deliver(source: str, items: list):
+    # items of one source, in order, a digest for every tag with several
+    groups = {}
+    for title, body in items:
+        groups.setdefault(tag(title), []).append((title, body))
+
+    for t, group in groups.items():
+        title, body = group[0]
+
+        if len(group) > 1:
+            title = f'{t} {len(group)} channels'.strip()
+            body = '\n\n'.join(f'{x}\n{y}' for x, y in group)
+            stats['digests'] += 1
+
+        try:
+            obj = await supervisor.blocking(apobj, source)
+            await asyncio.wait_for(
+                supervisor.blocking(obj.notify, title=title, body=body), TIMEOUT
+            )
+            stats['sent'] += 1
+
+        except TimeoutError:
+            stats['failed'] += 1
+            log.warning(f'notification timed out after {TIMEOUT}s: {title}')
+
+        except Exception as ex:
+            stats['failed'] += 1
+            log.exception(f'notification failed: {ex}')
+
+
+async def dispatch():
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch = [await queue.get()]
+
+        # burst => one notification per source and tag
+        end = loop.time() + WINDOW
+        while (left := end - loop.time()) > 0:
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), left))
+            except TimeoutError:
+                break
+
+        sources = {}
+        for source, title, body in batch:
+            sources.setdefault(source, []).append((title, body))
+
+        await asyncio.gather(*[deliver(s, items) for s, items in sources.items()])
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import shlex
+import shutil
+import subprocess as sp
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from loguru import logger as log
+from tabulate import tabulate
+
+from yk import procs, supervisor, util
+
+# post-processing of ended recordings, queued and saved to a file:
+#   merge (ytarchive's ffmpeg) => chat (jc) => rename ('[live]' prefix)
+# processes per step type are bounded and run with nice / ionice
+
+STEPS = ['merge', 'chat', 'rename']
+LIMITS = {'merge': 1, 'chat': 2, 'rename': 4}  # concurrent steps per type
+NICE = 10
+RETRIES = 3  # per step, then it's skipped
+BACKOFF = 60  # seconds, doubled for every retry
+
+path: Path | None = None
+nice = NICE
+jobs = {}  # id => job, pending ones are saved to path
+
+slots = {}  # step => asyncio.Semaphore
+counts = {s: {'running': 0, 'waiting': 0, 'done': 0, 'failed': 0} for s in STEPS}
+durations = {s: [0, 0.0, 0.0] for s in STEPS}  # step => [n, total, max]
+
+# 'python -m jc' wherever yk is started from
+JC_PATH = str(Path(__file__).resolve().parents[1])
+
+
+def setup(state: Path | str = '', limits: str = '', niceness: int = NICE):
+    # 'merge=1,chat=2' => LIMITS, pending jobs are started again
+    global path, nice
+    path = Path(state) if state else None
+    nice = niceness
+
+    for item in filter(None, limits.replace(' ', ',').split(',')):
+        try:
+            step, n = item.split('=')
+            if step not in LIMITS:
+                raise ValueError
+
+            LIMITS[step] = max(int(n), 1)
+        except ValueError:
+            log.error(f'invalid post-processing limit: {item!r}, expected step=n')
+
+    if path and path.is_file():
+        try:
+            jobs.update(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError) as ex:
+            log.error(f'failed to load post-processing queue {str(path)!r}, {ex}')
+
+    if jobs:
+        log.info(f'post-processing: resuming {len(jobs)} jobs')
+
+    for job in jobs.values():
+        supervisor.submit(run(job))
+
+
+def save():
+    if not path:
+        return
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(jobs, ensure_ascii=False), encoding='utf-8')
+        tmp.replace(path)
+    except OSError as ex:
+        log.error(f'failed to save post-processing queue {str(path)!r}, {ex}')
+
+
+def submit(folder: Path | str, blank: str, final: Path | str, offset: int, steps: list):
+    # from the supervisor loop
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'dir': str(folder),
+        'blank': blank,  # folder / name, without extension
+        'final': str(final),  # folder without '[live]'
+        'offset': offset,  # chat time offset
+        'steps': steps,
+        'tries': 0,
+        'ts': int(time.time()),
+    }
+
+    jobs[job['id']] = job
+    save()
+
+    return supervisor.submit(run(job))
+
+
+def niced(cmd: list):
+    prefix = []
+
+    if nice and shutil.which('nice'):
+        prefix += ['nice', '-n', str(nice)]
+
+    # best-effort class, 0..7 from niceness
+    if nice and shutil.which('ionice'):
+        prefix += ['ionice', '-c', '2', '-n', str(min(nice * 8 // 20, 7))]
+
+    return prefix + cmd
+
+
+async def spawn(cmd: list, out: str, **kw):
+    # => procs.Exit, None if stopped
+    with open(out, 'a') as f:
+        proc, ended = procs.spawn(
+            niced(cmd), stdin=sp.DEVNULL, stdout=f, stderr=f, **kw
+        )
+
+        if not await supervisor.until_stop(ended):
+            proc.terminate()
+            await ended
+            return None
+
+        return await ended
+
+
+def mux_files(folder: Path):
+    # => (ffmpeg cmd from ytarchive's *ffmpeg.txt, files to delete after)
+    c_merge = []
+    files = []
+
+    for file in os.listdir(folder):
+        if file.endswith('ffmpeg.txt'):
+            c_merge = shlex.split((folder / file).read_text())
+            files.append(folder / file)
+
+        if file.endswith('.ts'):
+            files.append(folder / file)
+
+    return c_merge, files
+
+
+async def merge(job: dict):
+    folder = Path(job['dir'])
+    c_merge, files = await supervisor.blocking(mux_files, folder)
+
+    if not c_merge:
+        log.error(f"can't find *ffmpeg.txt in {str(folder)!r}")
+        return True
+
+    # retries overwrite the partial output
+    if '-y' not in c_merge:
+        c_merge.insert(1, '-y')
+
+    ex = await spawn(c_merge, job['blank'] + '.log', cwd=folder)
+    if ex is None:
+        return None
+
+    if ex.code:
+        log.error(f'merge error: {folder}', exit=str(ex))
+        return False
+
+    for file in files:
+        await supervisor.blocking(util.delete, file)
+
+    return True
+
+
+async def chat(job: dict):
+    # prettify chat .json
+    file = job['blank'] + '.json'
+    if not Path(file).is_file():
+        return True
+
+    c_jc = [sys.executable, '-m', 'jc', '-o', str(job['offset']), file]
+    env = {**os.environ, 'PYTHONPATH': JC_PATH}
+
+    ex = await spawn(c_jc, os.devnull, env=env)
+    if ex is None:
+        return None
+
+    if ex.code:
+        log.error(f'jc error: {file}', exit=str(ex))
+        return False
+
+    return True
+
+
+def move(src: Path, dst: Path):
+    if not src.exists() and dst.exists():
+        return  # renamed before a restart
+
+    src.rename(dst)
+
+
+async def rename(job: dict):
+    # remove [live] prefix
+    await supervisor.blocking(move, Path(job['dir']), Path(job['final']))
+    return True
+
+
+RUNNERS = {'merge': merge, 'chat': chat, 'rename': rename}
+
+
+async def attempt(job: dict, step: str):
+    # => True: done, False: failed for good, None: stopped
+    c = counts[step]
+
+    while True:
+        slot = slots.setdefault(step, asyncio.Semaphore(LIMITS[step]))
+
+        c['waiting'] += 1
+        async with slot:
+            c['waiting'] -= 1
+
+            if supervisor.stopping.is_set():
+                return None
+
+            c['running'] += 1
+            ts = time.monotonic()
+
+            try:
+                ok = await RUNNERS[step](job)
+            except Exception as ex:
+                log.exception(f'{step} failed: {ex}', dir=job['dir'])
+                ok = False
+            finally:
+                c['running'] -= 1
+
+        if ok is None:
+            return None
+
+        d = durations[step]
+        took = time.monotonic() - ts
+        d[0] += 1
+        d[1] += took
+        d[2] = max(d[2], took)
+
+        if ok:
+            c['done'] += 1
+            return True
+
+        job['tries'] += 1
+        save()
+
+        if job['tries'] > RETRIES:
+            c['failed'] += 1
+            log.error(f'{step}: giving up after {RETRIES} retries', dir=job['dir'])
+            return False
+
+        delay = BACKOFF * 2 ** (job['tries'] - 1)
+        log.warning(f'{step}: retry in {delay}s', dir=job['dir'])
+
+        if not await supervisor.until_stop(asyncio.sleep(delay)):
+            return None
+
+
+async def run(job: dict):
+    # failed steps are skipped, the recording is still renamed
+    while job['steps']:
+        if await attempt(job, job['steps'][0]) is None:
+            return  # stays in the queue for the next start
+
+        job['steps'].pop(0)
+        job['tries'] = 0
+        save()
+
+    jobs.pop(job['id'], None)
+    save()
+
+    log.debug(f'post-processing done: {job["final"]}')
+
+
+def running():
+    return sum(c['running'] for c in counts.values())
+
+
+def show():
+    tab = [
+        [
+            step,
+            LIMITS[step],
+            counts[step]['running'],
+            counts[step]['waiting'],
+            counts[step]['done'],
+            counts[step]['failed'],
+            f'{durations[step][1] / (durations[step][0] or 1):.1f}s',
+            f'{durations[step][2]:.1f}s',
+        ]
+        for step in STEPS
+    ]
+
+    return tabulate(
+        tab,
+        headers=['step', 'limit', 'running', 'waiting', 'done', 'failed', 'avg', 'max'],
+        tablefmt='plain',
+    )
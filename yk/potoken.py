@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import requests
+from loguru import logger as log
+from tabulate import tabulate
+
+from . import limit, supervisor
+
+# po tokens from a bgutil server, cached per (bgutil, proxy):
+# refreshed on a timer before expiry while in use, one request in flight per key
+
+TTL = 6 * 3600  # seconds, if the server doesn't say
+REFRESH = 0.75  # part of the lifetime after which tokens are refreshed
+TIMEOUT = (10, 60)  # connect, read (/get_pot can be slow)
+
+
+@dataclass(slots=True)
+class Token:
+    value: str
+    ts: float  # monotonic
+    expires: float  # monotonic
+    used: bool = False  # looked up since it was stored
+
+    def stale(self, now: float):
+        return now > self.ts + (self.expires - self.ts) * REFRESH
+
+
+tokens = {}  # (bgutil, proxy) => Token
+inflight = {}  # (bgutil, proxy) => asyncio.Task
+timers = {}  # (bgutil, proxy) => asyncio.TimerHandle of the next refresh
+pinged = set()  # bgutil servers that answered /ping
+
+stats = {}  # (bgutil, proxy) => {hits, misses, requests, failed, latency}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+
+        return _session
+
+
+def request(bgutil: str, proxy: str = ''):
+    # => (token, lifetime in seconds), blocking
+    if bgutil not in pinged:
+        limit.acquire(bgutil)
+        r = session().get(bgutil + '/ping', timeout=TIMEOUT)
+        r.raise_for_status()
+
+        bg = r.json()
+        if 'server_uptime' not in bg or 'version' not in bg:
+            raise Exception(f'invalid /ping: {bg}')
+
+        pinged.add(bgutil)
+
+    limit.acquire(bgutil)
+    r = session().post(
+        bgutil + '/get_pot',
+        data={'proxy': proxy} if proxy else {},
+        timeout=TIMEOUT,
+    )
+    r.raise_for_status()
+
+    bg = r.json()
+    if 'poToken' not in bg:
+        raise Exception(f'invalid /get_pot: {bg}')
+
+    ttl = TTL
+    if bg.get('expiresAt'):
+        try:
+            expires = datetime.fromisoformat(bg['expiresAt'])
+            ttl = min(expires.timestamp() - time.time(), TTL)
+        except ValueError:
+            pass
+
+    return bg['poToken'], ttl
+
+
+async def _refresh(key: tuple):
+    s = stats[key]
+    ts = time.monotonic()
+
+    try:
+        token, ttl = await supervisor.blocking(request, *key)
+    except Exception as ex:
+        s['failed'] += 1
+        pinged.discard(key[0])
+        log.exception(f'bgutil - {str(ex)}')
+        return None
+
+    now = time.monotonic()
+    s['requests'] += 1
+    s['latency'] += now - ts
+
+    tokens[key] = Token(token, now, now + max(ttl, 0))
+    log.debug('get potoken from bgutil', token=token, proxy=key[1], ttl=int(ttl))
+
+    if timer := timers.pop(key, None):
+        timer.cancel()
+
+    timers[key] = asyncio.get_running_loop().call_later(
+        max(ttl, 0) * REFRESH, scheduled, key
+    )
+    return token
+
+
+def scheduled(key: tuple):
+    # timer: refresh tokens that were used, unused ones just expire
+    timers.pop(key, None)
+    token = tokens.get(key)
+
+    if token and token.used:
+        refresh(key)
+
+
+def refresh(key: tuple):
+    # => task of the request for key, shared by every caller
+    task = inflight.get(key)
+
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(_refresh(key))
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+
+    return task
+
+
+async def get(bgutil: str, proxy: str = ''):
+    # => po token, None if bgutil failed
+    key = (bgutil, proxy)
+    s = stats.setdefault(
+        key, {'hits': 0, 'misses': 0, 'requests': 0, 'failed': 0, 'latency': 0.0}
+    )
+
+    now = time.monotonic()
+    token = tokens.get(key)
+
+    if token and now < token.expires:
+        s['hits'] += 1
+        token.used = True
+        if token.stale(now):
+            refresh(key)  # timer missed it (unused / failed), this one is still valid
+
+        return token.value
+
+    s['misses'] += 1
+    return await asyncio.shield(refresh(key))
+
+
+def show():
+    tab = []
+    now = time.monotonic()
+
+    for (bgutil, proxy), s in sorted(stats.items()):
+        token = tokens.get((bgutil, proxy))
+        lookups = s['hits'] + s['misses']
+
+        tab.append([
+            bgutil,
+            proxy or '-',
+            f'{s["hits"] / (lookups or 1):.0%}',
+            s['requests'],
+            s['failed'],
+            f'{s["latency"] / (s["requests"] or 1):.1f}s',
+            f'{int(token.expires - now)}s' if token else '-',
+        ])  # fmt: skip
+
+    return tabulate(
+        tab,
+        headers=['bgutil', 'proxy', 'hits', 'requests', 'failed', 'latency', 'ttl'],
+        tablefmt='plain',
+    )
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger as log
+from tabulate import tabulate
+
+# weekly go-live histogram per channel, built from yk's own history
+
+BINS = 7 * 24  # hour of week
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+KEEP = 256  # go-live timestamps per channel
+SAMPLES = 5  # min go-lives for a usable model
+HALF_LIFE = 8 * 7 * 86400  # older streams count less
+HOT = 0.05  # share of go-lives around this hour to poll often
+
+
+def hour_of_week(ts: float):
+    dt = datetime.fromtimestamp(ts)
+    return dt.weekday() * 24 + dt.hour
+
+
+class Predictor:
+    def __init__(self, path: Path | str = ''):
+        self.path = Path(path) if path else None
+        self.lock = threading.Lock()
+        self.history = {}  # url => [ts, ...]
+        self.models = {}  # url => [share, ...] (BINS)
+
+        if self.path and self.path.is_file():
+            try:
+                self.history = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as ex:
+                log.error(f'failed to load history {str(self.path)!r}, {ex}')
+
+    def add(self, url: str, ts: float | None = None):
+        with self.lock:
+            h = self.history.setdefault(url, [])
+            h.append(int(ts or time.time()))
+            del h[:-KEEP]
+
+            self.models.pop(url, None)
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.history), encoding='utf-8')
+            tmp.replace(self.path)
+        except OSError as ex:
+            log.error(f'failed to save history {str(self.path)!r}, {ex}')
+
+    def model(self, url: str):
+        # => smoothed share of go-lives for every hour of week, or None
+        if url in self.models:
+            return self.models[url]
+
+        h = self.history.get(url) or []
+        if len(h) < SAMPLES:
+            return None
+
+        now = time.time()
+        raw = [0.0] * BINS
+        for ts in h:
+            raw[hour_of_week(ts)] += 0.5 ** ((now - ts) / HALF_LIFE)
+
+        total = sum(raw) or 1
+        m = [(raw[i - 1] + raw[i] + raw[(i + 1) % BINS]) / total for i in range(BINS)]
+
+        self.models[url] = m
+        return m
+
+    def hot(self, url: str, ts: float | None = None):
+        m = self.model(url)
+        return bool(m) and m[hour_of_week(ts or time.time())] >= HOT
+
+    def next_hot(self, url: str, ts: float | None = None):
+        # => start of the next hot hour (within a week), or None
+        m = self.model(url)
+        if not m:
+            return None
+
+        ts = ts or time.time()
+        hour = ts - ts % 3600
+
+        for i in range(1, BINS + 1):
+            if m[hour_of_week(hour + i * 3600)] >= HOT:
+                return hour + i * 3600
+
+    def show(self, urls: list = []):
+        tab = []
+
+        for url in urls or sorted(self.history):
+            h = self.history.get(url) or []
+            m = self.model(url)
+
+            windows = []
+            if m:
+                # consecutive hot hours => 'Sun 16:00-19:00'
+                for i in range(BINS):
+                    if m[i] < HOT:
+                        continue
+
+                    if windows and windows[-1][1] == i:
+                        windows[-1][1] = i + 1
+                    else:
+                        windows.append([i, i + 1])
+
+            top = ', '.join(
+                f'{DAYS[a // 24]} {a % 24:02}:00-{(b - 1) % 24 + 1:02}:00'
+                for a, b in windows
+            )
+
+            last = (
+                datetime.fromtimestamp(max(h)).strftime('%y-%m-%d %H:%M') if h else ''
+            )
+            tab.append([url, len(h), last, top or '-'])
+
+        return tabulate(
+            tab,
+            headers=['channel', 'go-lives', 'last', 'predicted windows'],
+            tablefmt='plain',
+        )
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+import threading
+from http.cookiejar import MozillaCookieJar
+from pathlib import Path
+
+import requests
+from loguru import logger as log
+
+from . import limit, util
+from .sched import Upcoming
+
+# cheap '/live' page probe for youtube channels,
+# full extraction is needed only if something is (maybe) live
+
+UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:140.0) Gecko/20100101 Firefox/140.0'
+
+RE_CANONICAL = re.compile(r'<link rel="canonical" href="([^"]+)"')
+LIVE_MARKERS = ['"isLiveNow":true', '"isLive":true']
+UPCOMING_MARKERS = ['"isUpcoming":true']
+RE_START_TIME = re.compile(r'"scheduledStartTime":"(\d+)"')
+RE_VIDEO_ID = re.compile(r'[?&]v=([\w-]{11})')
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def session(proxy: str = '', cookies: str = ''):
+    with sessions_lock:
+        if (proxy, cookies) in sessions:
+            return sessions[proxy, cookies]
+
+        s = requests.Session()
+        s.headers.update({'User-Agent': UA, 'Accept-Language': 'en-US,en;q=0.5'})
+
+        # skip consent page
+        s.cookies.set('SOCS', 'CAI', domain='.youtube.com')
+
+        if Path(cookies).is_file():
+            cj = MozillaCookieJar(cookies)
+            cj.load()
+            s.cookies.update(cj)
+
+        if proxy:
+            s.proxies = {'http': proxy, 'https': proxy}
+
+        sessions[proxy, cookies] = s
+        return s
+
+
+def yt_live(url: str, proxy: str = '', cookies: str = '', timeout: int = 15):
+    # watch?v= url: live (candidate), False: offline, None: unknown,
+    # Upcoming: scheduled (falsy), raises on proxy / network errors
+    # and limit.Later without a token
+    limit.take(url, proxy)
+
+    try:
+        r = session(proxy, cookies).get(url, timeout=timeout)
+        if r.status_code == 429:
+            limit.throttled(url, proxy)
+
+        r.raise_for_status()
+    except requests.HTTPError as ex:
+        log.trace(f'probe failed: {ex}', url=url, proxy=proxy)
+        return None
+    except requests.RequestException as ex:
+        log.trace(f'probe failed: {ex}', url=url, proxy=proxy)
+        raise
+
+    m = RE_CANONICAL.search(r.text)
+    if not m:
+        # consent / captcha / layout change
+        log.trace('probe: no canonical link', url=url, status=r.status_code)
+        return None
+
+    canonical = m.group(1)
+
+    # '/live' of offline channel points back to the channel itself
+    if 'watch?v=' not in canonical:
+        return False
+
+    if util.con(LIVE_MARKERS, r.text):
+        return canonical
+
+    if util.con(UPCOMING_MARKERS, r.text):
+        m = RE_START_TIME.search(r.text)
+        return Upcoming(canonical, int(m.group(1))) if m else False
+
+    return None
+
+
+def video_id(url: str):
+    m = RE_VIDEO_ID.search(url)
+    return m.group(1) if m else None
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import signal
+import subprocess as sp
+import threading
+from dataclasses import dataclass
+
+from loguru import logger as log
+
+# child process exits for the supervisor loop: pidfd_open + loop reader,
+# SIGCHLD where pidfds aren't available, wait4() for exit code and rusage
+
+SYS_PIDFD_OPEN = 434  # same on every arch, linux 5.3+
+
+
+@dataclass(slots=True)
+class Exit:
+    pid: int
+    code: int  # -N if killed by signal N
+    cpu: float  # user + system, seconds
+    rss: int  # max resident set, KiB
+
+    def __str__(self):
+        return f'exit {self.code}, cpu {self.cpu:.1f}s, rss {self.rss // 1024} MiB'
+
+
+loop: asyncio.AbstractEventLoop | None = None
+mode = ''  # 'pidfd' / 'sigchld' / 'poll'
+watched = {}  # pid => future
+
+_syscall = None
+
+
+def pidfd_open(pid: int):
+    # => fd, -1 if pidfds aren't supported
+    global _syscall
+
+    if hasattr(os, 'pidfd_open'):
+        try:
+            return os.pidfd_open(pid)
+        except OSError:
+            return -1
+
+    if _syscall is None:
+        try:
+            _syscall = ctypes.CDLL(
+                ctypes.util.find_library('c'), use_errno=True
+            ).syscall
+        except (OSError, AttributeError):
+            _syscall = False
+
+    if not _syscall:
+        return -1
+
+    return _syscall(SYS_PIDFD_OPEN, pid, 0)
+
+
+def setup(ev_loop: asyncio.AbstractEventLoop):
+    # from the main thread, SIGCHLD handlers can't be set anywhere else
+    global loop, mode
+    loop = ev_loop
+
+    fd = pidfd_open(os.getpid())
+    if fd >= 0:
+        os.close(fd)
+        mode = 'pidfd'
+
+    elif threading.current_thread() is threading.main_thread():
+        # python-level handlers wait for the main thread,
+        # the wakeup fd is written right in the c handler
+        mode = 'sigchld'
+        r, w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        signal.set_wakeup_fd(w, warn_on_full_buffer=False)
+        loop.add_reader(r, _wakeup, r)
+
+    else:
+        log.warning('procs: no pidfd and not in main thread, exits are polled')
+        mode = 'poll'
+        loop.call_soon_threadsafe(_poll)
+
+    log.debug(f'process watcher: {mode}')
+
+
+def _reap(pid: int):
+    # => True if pid has exited and its future is resolved
+    try:
+        r, status, ru = os.wait4(pid, os.WNOHANG)
+    except ChildProcessError:
+        r, status, ru = pid, 0, None  # reaped elsewhere
+
+    if r == 0:
+        return False
+
+    ex = Exit(
+        pid,
+        os.waitstatus_to_exitcode(status),
+        ru.ru_utime + ru.ru_stime if ru else 0.0,
+        ru.ru_maxrss if ru else 0,
+    )
+    future = watched.pop(pid, None)
+    if future and not future.done():
+        future.set_result(ex)
+
+    return True
+
+
+def _wakeup(fd: int):
+    # any signal, SIGCHLD is coalesced anyway
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        pass
+
+    _reap_all()
+
+
+def _reap_all():
+    for pid in list(watched):
+        _reap(pid)
+
+
+def _poll(pid: int | None = None):
+    # every watched pid, or a single one that has no pidfd
+    if pid is None:
+        _reap_all()
+    elif pid not in watched or _reap(pid):
+        return
+
+    loop.call_later(1, _poll, pid)
+
+
+def _ready(pid: int, fd: int):
+    loop.remove_reader(fd)
+    os.close(fd)
+    _reap(pid)
+
+
+def watch(proc: sp.Popen):
+    # => future of Exit, in the loop thread
+    future = loop.create_future()
+    watched[proc.pid] = future
+
+    # returncode set => Popen won't signal / reap a recycled pid
+    future.add_done_callback(
+        lambda f: f.cancelled() or setattr(proc, 'returncode', f.result().code)
+    )
+
+    if mode != 'pidfd':
+        _reap(proc.pid)  # could be gone before the watch
+        return future
+
+    fd = pidfd_open(proc.pid)
+    if fd >= 0:
+        loop.add_reader(fd, _ready, proc.pid, fd)
+    else:
+        _poll(proc.pid)  # e.g. out of fds
+
+    return future
+
+
+def spawn(cmd: list, **kw):
+    # => (Popen, future of Exit)
+    proc = sp.Popen(cmd, **kw)
+    return proc, watch(proc)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+
+from loguru import logger as log
+from tabulate import tabulate
+
+# health-scored pool of '--proxy' proxies, picked per check / recording
+# for channels without an explicit proxy in their list
+
+ALPHA = 0.2  # weight of the latest outcome in moving averages
+LATENCY = 5.0  # seconds, latency that halves the weight
+FAILS = 3  # failures in a row to quarantine a proxy
+QUARANTINE = 300  # seconds, doubled for every quarantine in a row
+QUARANTINE_MAX = 3600
+
+# transport errors of yt-dlp / streamlink / requests: on the proxy, not on
+# the stream ('Unable to download webpage: HTTP Error 404' is the channel's)
+NET_ERRORS = [
+    'Connection refused', 'timed out', 'ProxyError', 'Max retries exceeded',
+    'urlopen error',
+]  # fmt: skip
+
+
+def net_error(output: str):
+    # => True if the error lines of failed yt-dlp / streamlink are NET_ERRORS,
+    # retries / warnings of verbose output don't count
+    errors = [x for x in output.splitlines() if x.lower().startswith('error')]
+    return any(x in line for line in errors for x in NET_ERRORS)
+
+
+pool = {}  # proxy => Proxy
+pool_lock = threading.Lock()
+
+
+class Proxy:
+    def __init__(self, url: str):
+        self.url = url
+        self.health = 1.0  # success rate (moving average)
+        self.latency = 0.0  # seconds (moving average)
+        self.fails = 0  # in a row
+        self.strikes = 0  # quarantines in a row
+        self.until = 0.0  # quarantined until (monotonic)
+        self.ok = 0
+        self.failed = 0
+
+    def weight(self):
+        return max(self.health, 0.01) / (1 + self.latency / LATENCY)
+
+    def quarantined(self, now: float | None = None):
+        return self.until > (now or time.monotonic())
+
+
+def setup(urls: list = []):
+    with pool_lock:
+        pool.clear()
+        for url in filter(None, urls):
+            pool[url] = Proxy(url)
+
+    if len(pool) > 1:
+        log.debug(f'proxy pool: {len(pool)} proxies')
+
+
+def pick():
+    # => proxy url by weighted health, '' if the pool is empty
+    with pool_lock:
+        if not pool:
+            return ''
+
+        now = time.monotonic()
+        alive = [p for p in pool.values() if not p.quarantined(now)]
+
+        if not alive:
+            # everything is down, try the one that recovers first
+            return min(pool.values(), key=lambda p: p.until).url
+
+        return random.choices(alive, [p.weight() for p in alive])[0].url
+
+
+def report(url: str, ok: bool, latency: float = 0.0):
+    # checker / recorder outcome for a pooled proxy
+    with pool_lock:
+        p = pool.get(url)
+        if not p:
+            return  # explicit proxy from a list
+
+        p.health += ALPHA * (float(ok) - p.health)
+
+        if ok:
+            p.ok += 1
+            p.fails = p.strikes = 0
+            p.latency += ALPHA * (latency - p.latency) if p.ok > 1 else latency
+            return
+
+        p.failed += 1
+        p.fails += 1
+
+        if p.fails < FAILS:
+            return
+
+        cooldown = min(QUARANTINE * 2**p.strikes, QUARANTINE_MAX)
+        p.strikes += 1
+        p.fails = 0
+        p.until = time.monotonic() + cooldown
+
+    log.warning(f'proxy quarantined for {cooldown}s: {url}', health=f'{p.health:.2f}')
+
+
+def scores():
+    # => {proxy: weight}, 0 for quarantined ones
+    with pool_lock:
+        now = time.monotonic()
+        return {
+            u: 0.0 if p.quarantined(now) else round(p.weight(), 3)
+            for u, p in pool.items()
+        }
+
+
+def show():
+    with pool_lock:
+        items = sorted(pool.items())
+
+    now = time.monotonic()
+    tab = [
+        [
+            u,
+            f'{p.weight():.3f}',
+            f'{p.health:.2f}',
+            f'{p.latency:.1f}',
+            p.ok,
+            p.failed,
+            f'{int(p.until - now)}s' if p.quarantined(now) else '-',
+        ]
+        for u, p in items
+    ]
+
+    return tabulate(
+        tab,
+        headers=['proxy', 'score', 'health', 'latency', 'ok', 'failed', 'quarantine'],
+        tablefmt='plain',
+    )
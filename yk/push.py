@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import json
+import os
+import queue
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from loguru import logger as log
+
+from . import twitch, util
+
+# callback server for push notifications:
+#   /websub   - youtube feeds (https://pubsubhubbub.appspot.com)
+#   /eventsub - twitch eventsub webhooks (stream.online)
+# every notification turns into an immediate check of the channel
+
+HUB = os.getenv('YK_WEBSUB_HUB', 'https://pubsubhubbub.appspot.com/subscribe')
+TOPIC = 'https://www.youtube.com/xml/feeds/videos.xml?channel_id=%s'
+LEASE = 5 * 86400
+RENEW = 86400  # renew websub lease if less than that is left
+
+RE_CHANNEL_URL = re.compile(r'youtube\.com/channel/(UC[\w-]{22})')
+RE_TOPIC = re.compile(r'channel_id=(UC[\w-]{22})')
+RE_FEED_CHANNEL = re.compile(r'<yt:channelId>(UC[\w-]{22})</yt:channelId>')
+
+
+def key(url: str):
+    # => ('yt', channel_id) / ('tw', login) / None
+    if m := RE_CHANNEL_URL.search(url):
+        return 'yt', m.group(1)
+
+    if login := twitch.login(url):
+        return 'tw', login
+
+    return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: 'Server'
+
+    def log_message(self, fmt, *args):
+        log.trace(util.fesc(f'push: {fmt % args}'))
+
+    def reply(self, code: int, body: str = ''):
+        data = body.encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # websub subscription verification / denial,
+        # only for subscriptions requested by websub_sync
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        m = RE_TOPIC.search(q.get('hub.topic', ''))
+        if url.path != '/websub' or not m:
+            return self.reply(404)
+
+        channel_id = m.group(1)
+        mode = q.get('hub.mode')
+
+        if not self.server.pending(channel_id, mode):
+            log.warning(f'push: unexpected websub {mode} for {channel_id}')
+            return self.reply(404)
+
+        ch = ('yt', channel_id)
+
+        # denials have no challenge
+        if mode == 'denied':
+            log.warning(
+                f'push: websub denied for {channel_id}', reason=q.get('hub.reason')
+            )
+            self.server.unsubscribed(ch)
+            self.server.requested.pop(channel_id, None)
+            return self.reply(200)
+
+        if 'hub.challenge' not in q:
+            return self.reply(404)
+
+        match mode:
+            case 'subscribe':
+                lease = int(q.get('hub.lease_seconds') or LEASE)
+                self.server.subscribed(ch, time.time() + lease)
+            case 'unsubscribe':
+                self.server.unsubscribed(ch)
+
+        self.server.requested.pop(channel_id, None)
+        self.reply(200, q['hub.challenge'])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        match urlparse(self.path).path:
+            case '/websub':
+                self.websub(body)
+            case '/eventsub':
+                self.eventsub(body)
+            case _:
+                self.reply(404)
+
+    def websub(self, body: bytes):
+        secret = self.server.secret
+        if secret:
+            sig = self.headers.get('X-Hub-Signature', '')
+            mac = hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+            if not hmac.compare_digest(sig, f'sha1={mac}'):
+                log.warning('push: invalid websub signature')
+                return self.reply(403)
+
+        for channel_id in set(RE_FEED_CHANNEL.findall(body.decode(errors='replace'))):
+            self.server.notify(('yt', channel_id))
+
+        self.reply(204)
+
+    def eventsub(self, body: bytes):
+        h = self.headers
+        secret = self.server.secret
+
+        # twitch signs every message, unsigned ones can't be trusted
+        if not secret:
+            log.warning('push: eventsub message without --push-secret')
+            return self.reply(403)
+
+        msg = h.get('Twitch-Eventsub-Message-Id', '')
+        msg += h.get('Twitch-Eventsub-Message-Timestamp', '')
+        mac = hmac.new(secret.encode(), msg.encode() + body, hashlib.sha256)
+        sig = h.get('Twitch-Eventsub-Message-Signature', '')
+        if not hmac.compare_digest(sig, f'sha256={mac.hexdigest()}'):
+            log.warning('push: invalid eventsub signature')
+            return self.reply(403)
+
+        try:
+            data = json.loads(body)
+            sub = data['subscription']
+            login = sub['condition'].get('broadcaster_user_login') or ''
+            login = (data.get('event') or {}).get('broadcaster_user_login') or login
+        except (ValueError, KeyError, AttributeError):
+            return self.reply(400)
+
+        ch = ('tw', login.lower())
+
+        match h.get('Twitch-Eventsub-Message-Type'):
+            case 'webhook_callback_verification':
+                self.server.subscribed(ch)
+                return self.reply(200, data.get('challenge', ''))
+
+            case 'revocation':
+                self.server.unsubscribed(ch)
+
+            case 'notification':
+                self.server.subscribed(ch)
+                if sub.get('type') == 'stream.online':
+                    self.server.notify(ch)
+
+        self.reply(204)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, url: str = '', secret: str = ''):
+        super().__init__(('0.0.0.0', port), Handler)
+
+        self.url = url.rstrip('/')  # public url for websub callbacks
+        self.secret = secret
+        self.events = queue.SimpleQueue()  # keys of channels to check
+        self.subs = {}  # key => lease expiration (0 = no lease)
+        self.requested = {}  # channel_id => (mode, time) of unverified request
+        self.lock = threading.Lock()
+        self.version = 0  # bumped on every subscription change
+        self.session = requests.Session()
+
+        self.thread = threading.Thread(
+            target=self.serve_forever, name='push', daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        log.info(f'push server on :{self.server_port}', url=self.url)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def notify(self, ch: tuple):
+        log.debug(f'push: notification for {ch[1]}', ch=ch)
+        self.events.put(ch)
+
+    def subscribed(self, ch: tuple, expires: float = 0):
+        with self.lock:
+            if ch not in self.subs:
+                self.version += 1
+                log.debug(f'push: subscribed to {ch[1]}', ch=ch)
+            self.subs[ch] = expires
+
+    def unsubscribed(self, ch: tuple):
+        with self.lock:
+            if self.subs.pop(ch, None) is not None:
+                self.version += 1
+                log.debug(f'push: unsubscribed from {ch[1]}', ch=ch)
+
+    def pending(self, channel_id: str, mode: str):
+        # => True if mode ('subscribe' / ...) was requested for channel_id,
+        # hubs deny any of them
+        req = self.requested.get(channel_id)
+        return req is not None and mode in (req[0], 'denied')
+
+    def active(self, ch: tuple):
+        exp = self.subs.get(ch)
+        return exp is not None and (not exp or exp > time.time())
+
+    def drain(self):
+        r = set()
+        while not self.events.empty():
+            r.add(self.events.get())
+        return r
+
+    def websub_sync(self, channel_ids: set):
+        # (re)subscribe to youtube feeds
+        if not self.url:
+            return
+
+        for channel_id in channel_ids:
+            exp = self.subs.get(('yt', channel_id))
+            if exp and exp - time.time() > RENEW:
+                continue
+
+            # waiting for verification
+            _, ts = self.requested.get(channel_id, ('', 0))
+            if not exp and time.time() - ts < 3600:
+                continue
+
+            self.requested[channel_id] = ('subscribe', time.time())
+
+            data = {
+                'hub.callback': f'{self.url}/websub',
+                'hub.topic': TOPIC % channel_id,
+                'hub.mode': 'subscribe',
+                'hub.verify': 'async',
+                'hub.lease_seconds': LEASE,
+            }
+            if self.secret:
+                data['hub.secret'] = self.secret
+
+            try:
+                r = self.session.post(HUB, data=data, timeout=30)
+                r.raise_for_status()
+            except requests.RequestException as ex:
+                log.error(f'push: websub subscribe failed for {channel_id}, {ex}')
@@ -1,70 +1,100 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import json
 import os
 import re
 import shlex
 import shutil
-import signal
 import subprocess as sp
-import sys
-import threading
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
-import psutil
-import requests
 from loguru import logger as log
 from stopwatch import Stopwatch
 
-from jc.conv import conv as jc_conv
-from yk import util
-
-
-def main(
-    # cfg args
-    url: str = '',  # live-stream url
-    quality: str = 'best',  # quality of stream
-    output: str = '',  # output path
-    folder: str = '',  # subpath (output/folder)
-    regex_title: str = '',  # regex for stream title
-    regex_desc: str = '',  # regex for stream description
-    proxy: str = '',  # proxy for all connections (except apprise)
-    apprise: str = '',  # apprise url / path to yaml
-    cookies: str = '',  # path to cookies file (netscape format)
-    bgutil: str = '',  # url to potoken server (bgutil compatible)
-    recorder: str = '',  # recording tool
-    arguments: str = '',  # recording tool cli args
-    # non-cfg args
-    event: threading.Event = threading.Event(),  # for graceful shutdown
-    # unused (compatiblity for **cfg)
-    health: bool = False,
-    checker: bool = False,
-    delete: bool = False,
+from yk import (
+    limit,
+    notify,
+    post,
+    potoken,
+    procs,
+    proxies,
+    registry,
+    supervisor,
+    thumbs,
+    util,
+)
+from yk.config import ChannelConfig
+from yk.info import StreamInfo
+
+# regex-rejected broadcasts: channel url => video id,
+# checkers skip extraction while the id stays the same
+rejected = util.TTLCache(ttl=12 * 3600)
+
+SIDE_TIMEOUT = 60  # seconds for thumbnails / metadata
+CLAIM_WAIT = 15  # seconds to wait for higher priority checks of the same live
+
+# files of yk and recorders' state, not the recording itself
+OWN_FILES = ('.info', '.jpg', '.tmp', '.log', '.chat', '.json', '.ytdl', '.txt')
+
+
+async def run(cfg: ChannelConfig, **kw):
+    # supervisor task, final state of the recording for registry
+    state = registry.FAILED
+
+    try:
+        if await main(cfg, **kw) is not False:
+            state = registry.FINISHED
+    except Exception as ex:
+        log.exception(f'recording failed: {ex}', url=cfg.url)
+    finally:
+        registry.update(cfg.url, state)
+
+
+def names(info: StreamInfo):
+    # => (title, username) for files
+    match info.extractor:
+        case 'youtube':
+            title = info.title
+
+            # date suffix is added only to live titles
+            if info.is_live:
+                title = title[:-17]
+
+            return title, info.uploader
+
+        case 'twitch:stream':
+            return info.description, info.uploader
+
+        case 'wasdtv:stream':
+            return info.fulltitle, info.webpage_url_basename
+
+        case _:
+            return info.title, info.uploader
+
+
+def accepted(
+    info: StreamInfo,
+    regex_title: re.Pattern | None = None,
+    regex_desc: re.Pattern | None = None,
 ):
+    if regex_title and not regex_title.search(util.esc(names(info)[0])):
+        return False
 
-    _cfg = {
-        url: url,
-        quality: quality,
-        output: output,
-        folder: folder,
-        regex_title: regex_title,
-        regex_desc: regex_desc,
-        proxy: proxy,
-        apprise: apprise,
-        cookies: cookies,
-        bgutil: bgutil,
-        recorder: recorder,
-        arguments: arguments,
-    }
+    if regex_desc and info.description and not regex_desc.search(info.description):
+        return False
+
+    return True
 
-    # += '/live' for channel links
-    if 'youtube' in url and 'watch?v=' not in url:
-        url += '/live'
 
+async def get_info(
+    url: str, proxy: str = '', cookies: str = '', bgutil: str = '', wait=False
+):
+    # => full '--dump-json' document, for .info (checkers use StreamInfo only)
     c_info = [
-        '--dump-json', 
+        '--dump-json',
         '--no-playlist',
         '--playlist-items', "1",
         '--remote-components', 'ejs:github'
@@ -82,91 +112,163 @@ def main(
             f'youtubepot-bgutilhttp:base_url={bgutil}',
         ]
 
-    str_raw = ''
+    if wait:
+        # info for upcoming streams
+        c_info += ['--ignore-no-formats-error']
+
+    cmd = ' '.join(c_info)
+    await limit.wait(url, proxy)
+    ts = time.monotonic()
+
+    p = await asyncio.create_subprocess_exec(
+        'yt-dlp', *c_info, url, stdout=sp.PIPE, stderr=sp.PIPE
+    )
+    stdout, stderr = await p.communicate()
+    stdout = stdout.decode('utf-8', errors='replace')
+    stderr = stderr.decode('utf-8', errors='replace')
+
+    if p.returncode:
+        out = util.fesc(stdout + stderr)
+
+        if util.con(util.THROTTLED, stderr):
+            limit.throttled(url, proxy)
+
+        log.error(f'failed to get info\n{out}', url=url, cmd=cmd)
+        if util.con(proxies.NET_ERRORS + util.THROTTLED, stderr):
+            proxies.report(proxy, False)
+
+        return None
+
+    proxies.report(proxy, True, time.monotonic() - ts)
+
     try:
-        p = sp.run(
-            ['yt-dlp'] + c_info + [url],
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
+        return json.loads(stdout)
+    except:  # noqa: E722
+        log.exception(
+            f'failed to convert json info\n{util.fesc(stdout)}', url=url, cmd=cmd
         )
-        str_raw, _ = p.stdout, p.stderr
-    except sp.CalledProcessError:
-        cmd = ' '.join(c_info)
-        out = util.fesc(p.stdout + p.stderr)
+        return None
 
-        log.error(f'failed to get info\n{out}', cfg=_cfg, cmd=cmd)
-        sys.exit(1)
 
+async def aside(name: str, aw, timeout: float = SIDE_TIMEOUT):
+    # side task of a recording, can't delay or break it
     try:
-        str_json = json.loads(str_raw)
-    except:  # noqa: E722
-        log.exception(f'failed to convert json info\n{str_raw}', cfg=_cfg, cmd=cmd)
-        sys.exit(1)
+        return await asyncio.wait_for(aw, timeout)
+    except TimeoutError:
+        log.warning(f'{name}: timed out after {timeout}s')
+    except Exception as ex:
+        log.exception(f'{name}: {ex}')
 
-    # getting username and livestream title for files
-    match str_json['extractor']:
-        case 'youtube':
-            str_title = str_json['title'][:-17]
-            str_user = str_json['uploader']
 
-        case 'twitch:stream':
-            str_title = str_json['description']
-            str_user = str_json['uploader']
+def recorded(path: Path):
+    # => True once a recorder wrote something to path
+    try:
+        with os.scandir(path) as it:
+            return any(
+                f.is_file() and not f.name.endswith(OWN_FILES) and f.stat().st_size
+                for f in it
+            )
+    except OSError:
+        return False
+
+
+async def first_byte(path: Path, started: float, name: str):
+    # => seconds from started to the first recorded byte
+    delay = 0.25
+
+    while not await supervisor.blocking(recorded, path):
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 5)
+
+    ttfb = time.monotonic() - started
+    log.info(f'[recording] {name} first byte in {ttfb:.1f}s')
+    return ttfb
+
+
+async def main(
+    cfg: ChannelConfig,
+    url: str = '',  # live-stream url, if not the configured one (watch?v=)
+    wait: bool = False,  # scheduled stream, recorder waits for start
+    info: StreamInfo | None = None,  # yt-dlp info from checker
+    full: dict | None = None,  # its full yt-dlp document, for .info
+):
+    channel = cfg.url
+    url = url or cfg.url
 
-        case 'wasdtv:stream':
-            str_title = str_json['fulltitle']
-            str_user = str_json['webpage_url_basename']
+    quality = cfg.quality
+    output = cfg.output
+    folder = cfg.folder
+    proxy = cfg.proxy
+    apprise = cfg.apprise
+    cookies = cfg.cookies
+    bgutil = cfg.bgutil
+    recorder = cfg.recorder
+    arguments = cfg.arguments
 
-        case _:
-            str_title = str_json['title']
-            str_user = str_json['uploader']
+    started = time.monotonic()  # for time to first byte
 
+    # += '/live' for channel links
+    if 'youtube' in url and 'watch?v=' not in url:
+        url += '/live'
+
+    # checker's info is fresh enough, no need to extract it again
+    if info is None:
+        full = await get_info(url, proxy, cookies, bgutil, wait)
+        if not full:
+            return False
+
+    str_json = info or StreamInfo.parse(full)
+
+    str_title, str_user = names(str_json)
     str_title = util.esc(str_title)
     str_user = util.esc(str_user)
 
-    # regex filtering
-    if regex_title:
-        if not re.findall(regex_title.lower(), str_title.lower()):
-            return
+    # regex filtering (already done by serve for checker's info)
+    if not accepted(str_json, cfg.regex_title, cfg.regex_desc):
+        rejected.put(channel, str_json.id)
+        log.debug(f'rejected by regex: {str_title}', url=channel, id=str_json.id)
+        return
 
-    if regex_desc and str_json.get('description'):
-        if not re.findall(regex_desc.lower(), str_json['description'].lower()):
-            return
+    # already recording from another url
+    video = (str_json.extractor, str_json.id)
+    owner = registry.claim(video, channel, cfg.priority)
+
+    # channel with higher priority could be checked for this broadcast right
+    # now (its url / probe points to it) => its result takes it over
+    if owner.channel == channel:
+        deadline = time.monotonic() + CLAIM_WAIT
+        while registry.outranked(channel, video) and time.monotonic() < deadline:
+            if not await supervisor.until_stop(asyncio.sleep(0.25)):
+                return
+
+        owner = registry.commit(video, channel)
+
+    if owner.channel != channel:
+        registry.update(channel, registry.RECORDING, video)
+        log.info(f'[attached] ({str_user} - {str_title}) => {owner.channel}')
+
+        await supervisor.until_stop(asyncio.wrap_future(owner.done))
+        return
 
     # [YY_MM_DD hh_mm_ss] username - livestream title
     str_name = util.esc(f'[{util.dt_now()}] {str_user} - {str_title}')
 
     # folder for livestream
     str_dir = Path(output) / util.esc(folder) / f'[live] {str_name}'
-    str_dir.mkdir(parents=True, exist_ok=True)
+    await supervisor.blocking(str_dir.mkdir, parents=True, exist_ok=True)
 
     # template for livestream files (*.json, *.conv, *.log, ...)
     str_blank = str(str_dir / str_name)
 
-    # saving stream json
-    with open(str_blank + '.info', 'w', encoding='utf-8') as f:
-        f.write(util.pf(str_json))
-
-    # download youtube thumb
-    if 'youtube' in str_json['extractor']:
-        util.yt_dw_thumb(
-            path=str_blank + '.jpg',
-            video_id=str_json['id'],
-            proxy=proxy,
-        )
-
     # append 'online for HH:MM:SS' to notify
-    rls_ts = str_json.get('release_timestamp') or 0
-    if 'twitch' in str_json['extractor']:
-        rls_ts = str_json.get('timestamp') or 0
+    rls_ts = str_json.release_timestamp
+    if 'twitch' in str_json.extractor:
+        rls_ts = str_json.timestamp
 
-    epoch = str_json.get('epoch') or int(time.time())
+    epoch = str_json.epoch or int(time.time())
 
     since_str = ''
-    if rls_ts:
+    if rls_ts and rls_ts < epoch:
         rls_ts_td = datetime.fromtimestamp(rls_ts)
         epoch_td = datetime.fromtimestamp(epoch)
         delta_td = epoch_td - rls_ts_td
@@ -174,13 +276,16 @@ def main(
         since_str = f'\n(online for {util.timedelta_pretty(delta_td)})'
 
     # notify and log
+    status = 'ONLINE'
+    if str_json.live_status == 'is_upcoming':
+        status = 'WAITING'
+        since_str = f'\n(scheduled at {datetime.fromtimestamp(rls_ts)})'
+
     log.success(
-        f'[ONLINE] ({str_user} - {str_title + since_str.replace("\n", " ")}', cfg=_cfg
+        f'[{status}] ({str_user} - {str_title + since_str.replace("\n", " ")}',
+        cfg=cfg,
     )
 
-    apobj = util.get_apobj(apprise)
-    apobj.notify(title=f'[ONLINE] {str_user}', body=str_title + since_str)
-
     match recorder:
         case 'str':
             # streamlink cmd (default)
@@ -199,9 +304,12 @@ def main(
         case 'dlp':
             c = ['yt-dlp'] + shlex.split(arguments)
 
-            if 'youtube' in str_json['extractor']:
+            if 'youtube' in str_json.extractor:
                 c += ['--live-from-start']
 
+            if wait:
+                c += ['--wait-for-video', '15']
+
             if proxy:
                 c += ['--proxy', proxy]
 
@@ -224,33 +332,14 @@ def main(
             if Path(cookies).is_file():
                 c += ['--cookies', cookies]
 
+            if wait:
+                c += ['--wait']
+
             # disabled due to 'https://github.com/dreammu/ytarchive' fork
             if os.environ.get('YK_FORCE_YTARCHIVE_POTOKEN'):
-                try:
-                    r = requests.get(bgutil + '/ping', timeout=10)
-                    r.raise_for_status()
-
-                    bg = r.json()
-                    if 'server_uptime' not in bg or 'version' not in bg:
-                        raise Exception(f'invalid /ping: {bg}')
-
-                    r = requests.post(
-                        bgutil + '/get_pot',
-                        data={'proxy': proxy} if proxy else {},
-                        timeout=60,
-                    )
-                    r.raise_for_status()
-
-                    bg = r.json()
-                    if 'poToken' not in bg:
-                        raise Exception(f'invalid /get_pot: {bg}')
-
-                    log.debug('get potoken from bgutil', token=bg['poToken'])
-
-                    c += ['--potoken', bg['poToken']]
-
-                except Exception as ex:
-                    log.exception(f'bgutil - {str(ex)}')
+                token = await potoken.get(bgutil, proxy)
+                if token:
+                    c += ['--potoken', token]
 
             if bgutil and bgutil != 'http://127.0.0.1:4416':
                 c += [
@@ -272,7 +361,7 @@ def main(
     if Path(cookies).is_file():
         c_chat += ['--cookies', cookies]
 
-    c_chat = ['chat_downloader'] + c_chat + [str_json['webpage_url']]
+    c_chat = ['chat_downloader'] + c_chat + [str_json.webpage_url]
 
     # record process
     _rec_cmd_dbg = f'{recorder}: {" ".join(c)}'
@@ -282,8 +371,10 @@ def main(
     rec_txt.write(f'{_rec_cmd_dbg}\n\n')
     rec_txt.flush()
 
-    rec_proc = sp.Popen(c, stdout=rec_txt, stderr=rec_txt, cwd=str_dir)
-    rec_pid = psutil.Process(rec_proc.pid)
+    await limit.wait(url, proxy)
+    rec_proc, rec_exit = procs.spawn(c, stdout=rec_txt, stderr=rec_txt, cwd=str_dir)
+    registry.update(channel, registry.RECORDING, video)
+    log.debug(f'{recorder} spawned in {time.monotonic() - started:.2f}s', url=channel)
 
     _chat_bin = shutil.which('chat_downloader')
 
@@ -296,85 +387,93 @@ def main(
         chat_txt.write(f'{_chat_cmd_dbg}\n\n')
         chat_txt.flush()
 
-        chat_proc = sp.Popen(c_chat, stdout=chat_txt, stderr=chat_txt, cwd=str_dir)
-        chat_pid = psutil.Process(chat_proc.pid)
+        chat_proc, chat_exit = procs.spawn(
+            c_chat, stdout=chat_txt, stderr=chat_txt, cwd=str_dir
+        )
 
     # measure livestream duration
     sw = Stopwatch(2)
     sw.restart()
 
-    # looping until stream ended
-    while not event.is_set():
-        time.sleep(1)
+    # recorder is running, the rest goes alongside
+    notify.send(apprise, f'[{status}] {str_user}', str_title + since_str)
+
+    side = [
+        # saving stream json, StreamInfo fields if the checker had no document
+        aside(
+            'info',
+            supervisor.blocking(
+                util.write, str_blank + '.info', util.pf(full or str_json.dict())
+            ),
+        ),
+    ]
 
-        if not rec_pid.is_running():
-            break
+    # download youtube thumb
+    if 'youtube' in str_json.extractor:
+        side += [
+            aside('thumbnail', thumbs.fetch(str_blank + '.jpg', str_json.id, proxy))
+        ]
 
-        if rec_pid.status() == psutil.STATUS_ZOMBIE:
-            break
+    side = asyncio.gather(*side)
+    ttfb = asyncio.create_task(
+        first_byte(str_dir, started, f'({str_user} - {str_title})')
+    )
+
+    # waiting until stream ended (or shutdown)
+    ended = await supervisor.until_stop(rec_exit)
+    ttfb.cancel()
 
     total_time = timedelta(seconds=int(sw.duration))
 
     # shutdown stream process
-    if rec_pid.is_running():
-        if event.is_set():
-            os.kill(rec_proc.pid, signal.SIGTERM)
-        else:
-            os.waitpid(rec_proc.pid, 0)
-            apobj.notify(title=f'[offline] {str_user} ({total_time})', body=str_title)
-
-        log.info(f'[offline] ({str_user} - {str_title}) ', cfg=_cfg)
-
-    # manual ytarchive merging
-    if recorder == 'yta' and 'youtube' in str_json['extractor'] and not event.is_set():
-        c_merge = '=C'
-        files_to_delete = []
-
-        for file in os.listdir(str_dir):
-            if file.endswith('ffmpeg.txt'):
-                file_path = str_dir / file
-                file_content = open(file_path).read()
-                c_merge = shlex.split(file_content)
-                files_to_delete.append(file_path)
-
-            if file.endswith('.ts'):
-                file_path = str_dir / file
-                files_to_delete.append(file_path)
-
-        if c_merge == '=C':
-            log.error(f"can't find *ffmpeg.txt in {str_dir!r}", cfg=_cfg)
-        else:
-            with sp.Popen(c_merge, stderr=rec_txt) as proc:
-                while True:
-                    time.sleep(1)
-                    p = proc.poll()
-
-                    if p == 0:
-                        for file in files_to_delete:
-                            util.delete(file)
-                        break
-
-                    if p is not None:
-                        log.error(f'merge error: {str_dir}', cfg=_cfg)
-                        break
+    if not ended:
+        rec_proc.terminate()
+
+    ex = await rec_exit
+    rec_txt.write(f'\n\n{recorder}: {ex}\n')
+
+    await side
+
+    if ended:
+        notify.send(
+            apprise,
+            f'[offline] {str_user} ({total_time})',
+            f'{str_title}\n({recorder}: {ex})',
+        )
+
+    log.info(
+        f'[offline] ({str_user} - {str_title}) ',
+        cfg=cfg,
+        code=ex.code,
+        cpu=round(ex.cpu, 1),
+        rss=ex.rss,
+        ttfb=round(ttfb.result(), 1) if ttfb.done() and not ttfb.cancelled() else None,
+    )
+
+    registry.update(channel, registry.POST)
+
     rec_txt.close()
 
     # shutdown chat process
     if _chat_bin:
-        if chat_pid.is_running():
-            if chat_pid.status() == psutil.STATUS_ZOMBIE:
-                os.waitpid(chat_proc.pid, 0)
-            if chat_pid.is_running():
-                os.kill(chat_proc.pid, signal.SIGTERM)
+        if chat_proc.returncode is None:
+            chat_proc.terminate()
 
-        chat_txt.close()
+        ex = await chat_exit
+        log.debug(f'chat: {ex}', url=channel)
 
-    # prettify chat .json
-    if Path(str_blank + '.json').is_file():
-        try:
-            jc_conv(str_blank + '.json', time_offset=epoch - rls_ts)
-        except Exception as ex:
-            log.exception(f'jc error: {str(ex)}')
+        chat_txt.close()
 
-    # remove [live] prefix
-    str_dir.rename(Path(output) / util.esc(folder) / str_name)
+    # merging (ytarchive), prettify chat .json and [live] prefix removal
+    # are queued, a dozen ended streams shouldn't merge at once
+    steps = ['chat', 'rename']
+    if recorder == 'yta' and 'youtube' in str_json.extractor and ended:
+        steps = ['merge'] + steps
+
+    post.submit(
+        str_dir,
+        str_blank,
+        Path(output) / util.esc(folder) / str_name,
+        max(epoch - (rls_ts or epoch), 0),
+        steps,
+    )
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from loguru import logger as log
+from tabulate import tabulate
+
+# channels and their recordings, by configured url and by broadcast:
+#   checking => starting => recording => post-processing => finished / failed
+
+CHECKING = 'checking'
+STARTING = 'starting'
+RECORDING = 'recording'
+POST = 'post-processing'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+ACTIVE = (STARTING, RECORDING, POST)  # recording thread is alive
+KEEP = 64  # state changes per channel
+
+
+@dataclass(slots=True)
+class Entry:
+    channel: str  # configured url
+    state: str = ''
+    since: float = 0.0
+    video: tuple | None = None  # (extractor, video id)
+    priority: int = 0
+    owner: str = ''  # channel recording this broadcast, if attached
+    final: bool = False  # owner of its broadcast, can't be taken over anymore
+    candidate: str = ''  # video id the running check is about (url / probe)
+    done: Future = field(default_factory=Future)  # => final state
+    history: list = field(default_factory=list)  # [(state, ts), ...]
+
+
+entries = {}  # channel => Entry
+videos = {}  # (extractor, video id) => Entry of the recording channel
+ended = []  # (channel, state, seconds) of recordings ended since pop_ended()
+lock = threading.RLock()
+
+
+def _set(e: Entry, state: str):
+    e.state = state
+    e.since = time.time()
+    e.history.append((state, e.since))
+    del e.history[:-KEEP]
+
+
+def update(
+    channel: str, state: str, video: tuple | None = None, priority: int | None = None
+):
+    with lock:
+        e = entries.get(channel)
+
+        if e is None:
+            e = entries[channel] = Entry(channel)
+
+        elif state == CHECKING and e.state in ACTIVE:
+            return e  # checks don't interrupt recordings
+
+        if state == CHECKING:
+            e.candidate = ''
+
+        if state == STARTING:
+            e.done = Future()
+            e.owner = ''
+            e.final = False
+
+        if video:
+            e.video = video
+
+        if priority is not None:
+            e.priority = priority
+
+        _set(e, state)
+
+        if state in (FINISHED, FAILED):
+            if e.video and videos.get(e.video) is e:
+                del videos[e.video]
+            if not e.done.done():
+                e.done.set_result(state)
+
+            starts = [ts for s, ts in e.history if s == STARTING]
+            ended.append((channel, state, e.since - starts[-1] if starts else 0))
+
+    log.trace(f'{channel}: {state}', video=video)
+    return e
+
+
+def checked(channel: str):
+    # check is over and nothing started, back to the previous state
+    with lock:
+        e = entries.get(channel)
+        if not e or e.state != CHECKING:
+            return
+
+        prev = [s for s, _ in e.history[:-1] if s != CHECKING]
+        if prev:
+            _set(e, prev[-1])
+        else:
+            del entries[channel]
+
+
+def claim(video: tuple, channel: str, priority: int = 0):
+    # => Entry of the recording channel: the first claim, or one with higher
+    # priority while the owner isn't final (its recorder isn't spawned yet)
+    with lock:
+        owner = videos.get(video)
+
+        if owner and owner.state in ACTIVE and owner.channel != channel:
+            if owner.final or priority <= owner.priority:
+                if channel in entries:
+                    entries[channel].owner = owner.channel
+                return owner
+
+            # attaches to this channel on its next claim / commit
+            owner.owner = channel
+            log.debug(f'{channel} takes over {owner.channel}', video=video)
+
+        e = entries.get(channel)
+        if e is None:
+            e = entries[channel] = Entry(channel)
+            _set(e, STARTING)
+
+        e.video = video
+        e.priority = priority
+        e.owner = ''
+        videos[video] = e
+
+        return e
+
+
+def candidate(channel: str, video_id: str | None):
+    # checking channel is about video_id (watch?v= url, or found by probe)
+    with lock:
+        e = entries.get(channel)
+        if e and e.state == CHECKING and video_id:
+            e.candidate = video_id
+
+
+def outranked(channel: str, video: tuple):
+    # => True while a channel with higher priority is checked for the same
+    # broadcast, its result takes it over
+    with lock:
+        e = entries.get(channel)
+        priority = e.priority if e else 0
+
+        return any(
+            x.state == CHECKING and x.priority > priority and x.candidate == video[1]
+            for x in entries.values()
+        )
+
+
+def commit(video: tuple, channel: str):
+    # => Entry of the recording channel, final if it's channel
+    with lock:
+        e = entries.get(channel)
+        owner = claim(video, channel, e.priority if e else 0)
+
+        if owner.channel == channel:
+            owner.final = True
+
+        return owner
+
+
+def forget(channel: str):
+    # removed from lists, recording (if any) keeps its entry until it ends
+    with lock:
+        e = entries.get(channel)
+        if e and e.state not in ACTIVE:
+            del entries[channel]
+
+
+def get(channel: str):
+    return entries.get(channel)
+
+
+def state(channel: str):
+    e = entries.get(channel)
+    return e.state if e else ''
+
+
+def running(channel: str):
+    return state(channel) in ACTIVE
+
+
+def active():
+    with lock:
+        return [c for c, e in entries.items() if e.state in ACTIVE]
+
+
+def pop_ended():
+    with lock:
+        r = ended[:]
+        ended.clear()
+        return r
+
+
+def summary():
+    # => {state: count}
+    r = {}
+    with lock:
+        for e in entries.values():
+            r[e.state] = r.get(e.state, 0) + 1
+
+    return r
+
+
+def show():
+    with lock:
+        items = sorted(entries.items())
+
+    now = time.time()
+    tab = [
+        [
+            c,
+            e.state,
+            f'{int(now - e.since)}s',
+            e.video[1] if e.video else '-',
+            e.owner or '-',
+        ]
+        for c, e in items
+    ]
+
+    return tabulate(
+        tab,
+        headers=['channel', 'state', 'for', 'video', 'attached to'],
+        tablefmt='plain',
+    )
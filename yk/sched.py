@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import math
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from loguru import logger as log
+from tabulate import tabulate
+
+BACKOFF = 1.1  # interval multiplier for every offline check
+JITTER = 0.1  # spread checks a bit, so they don't bunch up
+TICK = 15  # seconds, shared check times of batched channels ('twb')
+SHORT = 120  # seconds, shorter recordings count as failed ones
+RETRY = 2  # interval multiplier for every failed / short recording in a row
+
+
+@dataclass(frozen=True)
+class Upcoming:
+    # scheduled broadcast, reported by checkers instead of True/False
+
+    url: str  # watch?v= url of the broadcast
+    ts: int  # release_timestamp
+
+    def __bool__(self):
+        return False  # not live yet
+
+
+class Scheduler:
+    # heap of per-channel next-due times (lazy deletion via 'due')
+
+    def __init__(self, lead: int = 0, model=None):
+        self.heap = []  # [(due, seq, url), ...]
+        self.seq = itertools.count()
+        self.state = {}  # url => {...}
+        self.lead = lead  # start recorder N seconds before scheduled time
+        self.model = model  # predict.Predictor
+        self.safety = {}  # url => interval, for channels with push notifications
+
+    def add(self, url: str, min_interval: int, max_interval: int, batched=False):
+        # batched: checked together with others, due times are on TICK
+        if url in self.state:
+            st = self.state[url]
+            st['min'], st['max'] = min_interval, max_interval
+            st['batched'] = batched
+            st['interval'] = min(max(st['interval'], min_interval), max_interval)
+            return
+
+        self.state[url] = {
+            'min': min_interval,
+            'max': max_interval,
+            'interval': min_interval,
+            'offline': 0,  # offline checks in a row
+            'fails': 0,  # failed checks in a row
+            'broken': 0,  # failed / short recordings in a row
+            'upcoming': None,  # Upcoming
+            'armed': '',  # url of the last pre-armed broadcast
+            'due': 0,
+            'batched': batched,
+        }
+        self.push(url, time.time())
+
+    def remove(self, url: str):
+        self.state.pop(url, None)
+
+    def push(self, url: str, due: float):
+        st = self.state.get(url)
+        if not st:
+            return
+
+        # later checks of batched channels wait for the next shared tick,
+        # so they are due in the same loop round and go in one request
+        if st['batched'] and due > time.time():
+            due = math.ceil(due / TICK) * TICK
+
+        st['due'] = due
+        heapq.heappush(self.heap, (due, next(self.seq), url))
+
+    def pop_due(self, now: float | None = None):
+        now = now or time.time()
+        r = []
+
+        while self.heap and self.heap[0][0] <= now:
+            due, _, url = heapq.heappop(self.heap)
+
+            st = self.state.get(url)
+            if not st or st['due'] != due:
+                continue  # removed or rescheduled
+
+            st['due'] = None  # checking
+            r.append(url)
+
+        return r
+
+    def done(self, url: str, stream):
+        # stream: True => online, False => offline, None => check failed
+        st = self.state.get(url)
+        if not st:
+            return
+
+        st['upcoming'] = None
+
+        if isinstance(stream, Upcoming):
+            return self.wait(url, stream)
+
+        if stream is None:
+            # retry sooner
+            st['fails'] += 1
+            st['interval'] = st['min']
+
+        elif stream:
+            st['fails'] = st['offline'] = 0
+            st['interval'] = st['min']
+
+        else:
+            st['fails'] = 0
+            st['offline'] += 1
+            st['interval'] = min(st['interval'] * BACKOFF, st['max'])
+
+            if self.model and self.model.model(url):
+                st['interval'] = self.predicted(url, st)
+
+            if url in self.safety:
+                st['interval'] = max(st['interval'], self.safety[url])
+
+        delay = st['interval']
+        if not st['batched']:
+            delay *= random.uniform(1 - JITTER, 1 + JITTER)
+
+        self.push(url, time.time() + delay)
+
+        log.trace('next check', url=url, delay=int(delay), stream=stream)
+
+    def predicted(self, url: str, st: dict):
+        # tight polling around usual stream times, relaxed outside of them
+        now = time.time()
+
+        if self.model.hot(url, now):
+            return st['min']
+
+        nxt = self.model.next_hot(url, now)
+        if nxt:
+            return min(max(nxt - now, st['min']), st['max'])
+
+        return st['max']
+
+    def wait(self, url: str, stream: Upcoming):
+        # sleep until shortly before the scheduled start,
+        # but not longer than max interval (far-away / placeholder streams)
+        st = self.state[url]
+        st['fails'] = st['offline'] = 0
+        st['interval'] = st['min']
+        st['upcoming'] = stream
+
+        now = time.time()
+        due = min(stream.ts - self.lead, now + st['max'])
+
+        if stream.url == st['armed']:
+            # recorder already tried, it's late or was rescheduled
+            due = now + st['min']
+
+        self.push(url, max(now, due))
+
+        log.trace('waiting for scheduled stream', url=url, stream=stream)
+
+    def armed(self, url: str):
+        # => Upcoming, if it's time to start the recorder
+        st = self.state.get(url)
+        if not st or st['upcoming'] is None:
+            return None
+
+        if st['upcoming'].ts - self.lead > time.time():
+            return None  # just a re-check
+
+        stream, st['upcoming'] = st['upcoming'], None
+        st['armed'] = stream.url
+        return stream
+
+    def schedule(self):
+        # => {url: Upcoming}
+        return {
+            u: st['upcoming']
+            for u, st in self.state.items()
+            if st['upcoming'] is not None
+        }
+
+    def show(self):
+        # table of scheduled broadcasts, soonest first
+        now = time.time()
+        tab = [
+            [url, up.url, datetime.fromtimestamp(up.ts), f'{int(up.ts - now)}s']
+            for url, up in sorted(self.schedule().items(), key=lambda x: x[1].ts)
+        ]
+
+        return tabulate(
+            tab, headers=['channel', 'stream', 'start', 'in'], tablefmt='plain'
+        )
+
+    def poke(self, url: str):
+        # check as soon as possible (unless it's checking right now)
+        st = self.state.get(url)
+        if st and st['due'] is not None:
+            self.push(url, time.time())
+
+    def ended(self, url: str, failed: bool = False, duration: float = 0):
+        # recording is over, check again after min interval,
+        # backing off for the ones recorder can't handle (members-only etc.)
+        st = self.state.get(url)
+        if not st:
+            return
+
+        if failed or duration < SHORT:
+            st['broken'] += 1
+        else:
+            st['broken'] = 0
+
+        st['offline'] = 0
+        st['interval'] = st['min']
+
+        delay = min(st['min'] * RETRY ** st['broken'], max(st['max'], st['min']))
+        self.push(url, time.time() + delay)
+
+        log.trace('recording ended', url=url, delay=int(delay), failed=failed)
+
+    def later(self, url: str, delay: float):
+        # check couldn't get a rate limit token, same state in delay seconds
+        self.push(url, time.time() + delay)
+
+    def hold(self, url: str):
+        # recording elsewhere, look again later
+        st = self.state.get(url)
+        if st:
+            self.push(url, time.time() + st['min'])
@@ -3,48 +3,124 @@
 import json
 import shutil
 import subprocess as sp
-import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import replace
+from datetime import datetime
 from pathlib import Path
 
+import requests
 from loguru import logger as log
 
-from . import config, record, util
+from . import (
+    config,
+    extract,
+    limit,
+    notify,
+    post,
+    potoken,
+    predict,
+    probe,
+    proxies,
+    push,
+    record,
+    registry,
+    sched,
+    supervisor,
+    thumbs,
+    twitch,
+    util,
+    watch,
+)
+from .config import ChannelConfig
+from .info import TEMPLATE, StreamInfo
 
 first_launch = True
-unload = threading.Event()
 
+HEALTH_EVERY = 3600  # seconds between failed healthcheck notifications
 
-def get_threads(raw: bool = False):
-    threads = [x for x in threading.enumerate() if x.name != 'MainThread']
+# (StreamInfo, full yt-dlp document or None) of live channels,
+# handed to record.main, the document ends up in .info
+infos = util.TTLCache(ttl=60)
 
-    if raw:
-        return threads
+announced = {}  # channel url => Upcoming last logged at info
 
-    return [x.name for x in threads]
 
+def upcoming(info: StreamInfo):
+    if info.live_status == 'is_upcoming' and info.release_timestamp:
+        return sched.Upcoming(info.webpage_url, info.release_timestamp)
 
-def is_running(name: str = ''):
-    threads = get_threads()
 
-    if name in threads:
-        log.trace('thread RUNNING', name=name, threads=threads)
-        return True
+def yt_probe(key, url, proxy_url: str = '', cookies_txt: str = ''):
+    # => False / Upcoming to return right away, watch?v= url (candidate)
+    # or None (unknown) to go on with extraction
+    p = probe.yt_live(url, proxy_url, cookies_txt)
+    if p is not None and not p:
+        log.trace(f'offline (probe), {p}', url=url, proxy=proxy_url)
+        return p
 
-    log.trace('thread not running', name=name, threads=threads)
-    return False
+    # still the same regex-rejected broadcast
+    if p and probe.video_id(p) == record.rejected.get(key):
+        log.trace(f'rejected stream (probe), {p}', url=url, proxy=proxy_url)
+        return False
+
+    return p
 
 
 def dlp_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
+    key = url
+    dump = True  # full document for .info, unless the probe found nothing
+
     if 'youtube' in url and 'watch?v=' not in url:
         url += '/live'
 
+        try:
+            p = yt_probe(key, url, proxy_url, cookies_txt)
+        except requests.RequestException:
+            return None  # dead proxy / network, not an offline channel
+
+        if p is not None and not p:
+            return p
+
+        if p:
+            registry.candidate(key, probe.video_id(p))
+
+        dump = bool(p)
+
+    # one token per check, warm worker or subprocess
+    limit.take(url, proxy_url)
+
+    r = extract.check('dlp', url, proxy_url, cookies_txt)
+    if r and r['online'] is not None:
+        log.trace(
+            f'dlp_is_live (warm): {r["online"]}\n{util.fesc(r["log"])}',
+            url=url,
+            proxy=proxy_url,
+            cookies_txt=cookies_txt,
+        )
+
+        if not r['online'] and util.con(util.THROTTLED, r['log']):
+            limit.throttled(url, proxy_url)
+            return None
+
+        # failed extraction (no info), not warnings of a successful one
+        if not r['info'] and proxies.net_error(r['log']):
+            return None
+
+        # full document from workers only for live ones
+        info = StreamInfo.parse(r['info'])
+        if r['online']:
+            infos.put(key, (info, r['info']))
+
+        return r['online'] or upcoming(info) or False
+
     cmd = [
         '--verbose',
-        '--dump-json', 
+        *(['--dump-json'] if dump else ['--print', TEMPLATE]),
         '--no-playlist',
         '--playlist-items', "1",
-        '--remote-components', 'ejs:github'
+        '--remote-components', 'ejs:github',
+        '--ignore-no-formats-error'
     ]  # fmt: skip
 
     if proxy_url:
@@ -66,8 +142,12 @@ def dlp_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
 
         if proc.poll() == 0:
             try:
-                c_json = json.loads(stdout)
-                online = c_json.get('is_live') or False
+                d = json.loads(stdout)
+                info = StreamInfo.parse(d)
+                online = info.is_live or upcoming(info) or False
+
+                if online:
+                    infos.put(key, (info, d if dump else None))
             except:  # noqa: E722
                 log.exception(
                     f'failed to convert json info\n{util.fesc(stdout + stderr)}',
@@ -75,6 +155,14 @@ def dlp_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
                     cmd=cmd,
                 )
 
+        elif util.con(util.THROTTLED, stderr):
+            # failed check, not offline channel
+            limit.throttled(url, proxy_url)
+            online = None
+
+        elif proxies.net_error(stderr):
+            online = None
+
         log.trace(
             f'dlp_is_live: {online}\n{util.fesc(stderr)}',
             url=url,
@@ -86,9 +174,40 @@ def dlp_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
 
 
 def str_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
+    key = url
+
     if 'youtube' in url and 'watch?v=' not in url:
         url += '/live'
 
+        try:
+            p = yt_probe(key, url, proxy_url, cookies_txt)
+        except requests.RequestException:
+            return None  # dead proxy / network, not an offline channel
+
+        if p is not None and not p:
+            return p
+
+        if p:
+            registry.candidate(key, probe.video_id(p))
+
+    # one token per check, warm worker or subprocess
+    limit.take(url, proxy_url)
+
+    r = extract.check('str', url, proxy_url, cookies_txt)
+    if r and r['online'] is not None:
+        log.trace(
+            f'str_is_live (warm): {r["online"]}\n{util.fesc(r["log"])}',
+            url=url,
+            proxy=proxy_url,
+            cookies_txt=cookies_txt,
+        )
+
+        # log of a failed check is its error, of a successful one stream names
+        if not r['online'] and util.con(proxies.NET_ERRORS, r['log']):
+            return None
+
+        return r['online']
+
     cmd = ['--loglevel', 'trace', '--url', url]
 
     if proxy_url:
@@ -109,6 +228,9 @@ def str_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
         online = proc.poll() == 0
         output = util.fesc(stdout + stderr)
 
+        if not online and proxies.net_error(stdout + stderr):
+            online = None
+
         log.trace(
             f'str_is_live: {online}\n{output}',
             url=url,
@@ -119,6 +241,139 @@ def str_is_live(url, proxy_url: str = '', cookies_txt: str = ''):
         return online
 
 
+def twb_is_live(urls: list, proxy_url: str = ''):
+    logins = [twitch.login(url) for url in urls]
+
+    try:
+        streams = twitch.is_live(list(filter(None, logins)), proxy_url)
+    except limit.Later:
+        raise
+    except Exception as ex:
+        log.error(f'twb_is_live: {util.fesc(str(ex))}', proxy=proxy_url)
+        return [None] * len(urls)
+
+    online = [
+        bool(streams.get(x)) and streams[x]['id'] != record.rejected.get(url)
+        for x, url in zip(logins, urls)
+    ]
+
+    log.trace(
+        f'twb_is_live: {sum(online)} / {len(urls)}',
+        proxy=proxy_url,
+        online=[x for x, o in zip(logins, online) if o],
+    )
+    return online
+
+
+def check(cfgs: list[ChannelConfig]):
+    # => [stream, ...] for every cfg
+    cfg = cfgs[0]
+
+    # list proxy, or the healthiest one from '--proxy' pool
+    proxy = cfg.proxy or proxies.pick()
+
+    # checks don't wait for rate limit tokens, it's all on the proxy
+    ts = time.monotonic()
+
+    try:
+        match cfg.checker:
+            case 'twb':
+                r = twb_is_live([x.url for x in cfgs], proxy)
+
+            case 'str':
+                r = [str_is_live(cfg.url, proxy, cfg.cookies)]
+
+            case 'dlp':
+                r = [dlp_is_live(cfg.url, proxy, cfg.cookies)]
+
+            case _:
+                log.error(f'invalid checker: {cfg.checker}', cfg=cfg)
+                return [False]
+
+    except limit.Later as ex:
+        # no token, workers don't wait for them => scheduled again
+        log.trace(f'check deferred: {ex}', url=cfg.url, proxy=proxy)
+        return [ex] * len(cfgs)
+
+    if proxy:
+        ok = any(x is not None for x in r)
+        proxies.report(proxy, ok, time.monotonic() - ts)
+
+    return r
+
+
+def start_recording(ch: str, cfg: ChannelConfig, args, channels: dict, **kw):
+    log.debug(f'start recording: {ch}', cfg=cfg, kw=kw)
+
+    if cfg.delete:
+        config.parse(i=args.urls + args.input, args=args, cfg_to_del=cfg)
+
+        # mtime is preserved on deletion, so drop it from the current list too
+        channels.pop(ch, None)
+
+    # fresh info from 'dlp' checker (none for 'str' / 'twb')
+    info, full = infos.pop(cfg.url) or (None, None)
+    kw.setdefault('info', info)
+    kw.setdefault('full', full)
+
+    # recording proxy from the pool
+    if not cfg.proxy and proxies.pool:
+        cfg = replace(cfg, proxy=proxies.pick())
+
+    # claimed right away, so threads can't race for the broadcast
+    video = None
+    if kw['info']:
+        video = (kw['info'].extractor, kw['info'].id)
+
+    registry.update(cfg.url, registry.STARTING, video)
+    if video:
+        registry.claim(video, cfg.url, cfg.priority)
+
+    return supervisor.submit(record.run(cfg, **kw))
+
+
+def on_checked(ch: str, cfg: ChannelConfig, stream, args, channels: dict):
+    if cfg.health:
+        if not stream:
+            log.error(f'HEALTHCHECK FAILED: {cfg.url}')
+
+            notify.send(
+                cfg.apprise,
+                '[HEALTHCHECK FAILED]',
+                cfg.url,
+                key=f'health:{cfg.url}',
+                every=HEALTH_EVERY,
+            )
+        else:
+            log.debug(f'health ok: {ch}')
+
+    elif stream:
+        info, _ = infos.get(cfg.url) or (None, None)
+        if info and not record.accepted(info, cfg.regex_title, cfg.regex_desc):
+            # skipped without extraction until the video id changes
+            infos.pop(cfg.url)
+            record.rejected.put(cfg.url, info.id)
+            log.debug(
+                f'rejected by regex: {record.names(info)[0]}',
+                url=cfg.url,
+                id=info.id,
+            )
+            return None
+
+        return start_recording(ch, cfg, args, channels)
+
+    elif isinstance(stream, sched.Upcoming):
+        # re-checks of an announced broadcast only at debug
+        first = announced.get(cfg.url) != stream
+        announced[cfg.url] = stream
+
+        log.log(
+            'INFO' if first else 'DEBUG',
+            f'[UPCOMING] {ch} at {datetime.fromtimestamp(stream.ts)}',
+            url=stream.url,
+        )
+
+
 def main(args):
     global first_launch
 
@@ -142,101 +397,231 @@ def main(args):
         log.critical('no channel lists, add some with "-i" argument')
         return 1
 
+    extract.setup(args.check_workers, args.extract_jobs)
+    limit.setup(args.rate)
+    proxies.setup(args.proxy)
+    supervisor.start(args.blocking_workers)
+    post.setup(args.post_queue, args.post_jobs, args.post_nice)
+
     log.info('started!')
+    log.debug(
+        'warm extractors',
+        dlp=extract.available('dlp'),
+        str=extract.available('str'),
+        jobs=args.extract_jobs,
+    )
+
+    # live-checks are running in a bounded pool,
+    # scheduler decides which channel is due next
+    pool = ThreadPoolExecutor(max(1, args.check_workers), thread_name_prefix='chk')
+    checks = {}  # future => [(ch, cfg), ...]
+    model = predict.Predictor(args.history)
+    queue = sched.Scheduler(lead=args.lead_time, model=model)
+
+    # optional push notifications, polling becomes a safety net
+    srv = None
+    if args.push_port:
+        srv = push.Server(args.push_port, args.push_url, args.push_secret)
+        srv.start()
+
+    report = time.time() + 600  # next rate limiter / proxy report
+
+    # per-file channels, only changed lists are parsed again
+    watcher = watch.Watcher(list(filter(None, args.input)))
+    lists = {}  # list file / url => channels
+    channels = {}  # all lists merged
+    by_url = {}  # url => (ch, cfg)
+    keys = {}  # url => push key
+    by_key = {}  # push key => [url, ...]
+    subs = (-1, 0)  # (subscriptions version, next websub renewal)
 
     try:
         while True:
-            mtimes = util.sum_mtime(args.input)
+            changed = watcher.changed()
 
-            def _sleep():
-                # sleeping, but checking for toml changes
-                for i in range(args.delay):
-                    if util.sum_mtime(args.input) == mtimes:
-                        time.sleep(1)
-
-            channels = config.parse(i=args.urls + args.input, args=args)
-            if not channels:
-                log.error('no channels for monitoring', input=args.input)
+            if changed or first_launch:
                 if first_launch:
-                    return 1
+                    for url in args.urls:
+                        lists[url] = config.parse(i=[url], args=args)
 
-                _sleep()
-                continue
+                for file in changed:
+                    lists[file] = config.parse(i=[file], args=args)
+
+                channels = config.merge(
+                    [lists.get(x) or {} for x in args.urls + args.input]
+                )
+
+                # applied to the scheduler, per-channel state stays
+                old, by_url = by_url, {c.url: (ch, c) for ch, c in channels.items()}
+                added, removed, updated = config.diff(old, by_url)
+
+                for url in removed:
+                    queue.remove(url)
+                    registry.forget(url)
+
+                for url in added + updated:
+                    cfg = by_url[url][1]
+                    queue.add(
+                        url,
+                        cfg.min_interval,
+                        cfg.max_interval,
+                        batched=cfg.checker == 'twb',
+                    )
 
-            for i, (ch, cfg) in enumerate(channels.items(), start=1):
-                if util.sum_mtime(args.input) != mtimes:
+                keys = {url: push.key(url) for url in by_url}
+                by_key = {}
+                for url, k in keys.items():
+                    by_key.setdefault(k, []).append(url)
+
+                if added or removed:
+                    subs = (-1, 0)
+
+                if not first_launch:
                     log.info(
-                        'list updated!', old=mtimes, new=util.sum_mtime(args.input)
+                        f'list updated! +{len(added)} -{len(removed)} ~{len(updated)}',
+                        files=sorted(changed),
                     )
-                    break
-
-                if is_running(cfg['url']):
-                    if len(channels) == threading.active_count() - 1:
-                        log.debug(
-                            'everything is online',
-                            threads=get_threads(),
-                        )
-                        _sleep()
+
+                if not channels:
+                    log.error('no channels for monitoring', input=args.input)
+                    if first_launch:
+                        return 1
+
+                first_launch = False
+
+            if not channels:
+                time.sleep(1)
+                continue
+
+            if srv:
+                for k in srv.drain():
+                    for url in by_key.get(k, []):
+                        queue.poke(url)
+
+                if subs[0] != srv.version or subs[1] < time.time():
+                    yt = {k[1] for k in keys.values() if k and k[0] == 'yt'}
+                    pool.submit(srv.websub_sync, yt)
+
+                    queue.safety = {
+                        url: args.push_interval
+                        for url, k in keys.items()
+                        if k and srv.active(k)
+                    }
+                    subs = (srv.version, time.time() + 3600)
+
+            if report < time.time():
+                log.debug('rate limits:\n' + limit.show())
+                if proxies.pool:
+                    log.debug('proxies:\n' + proxies.show())
+                log.debug('channels:\n' + registry.show())
+                log.debug('notifications', **notify.stats)
+                log.debug('thumbnails', **thumbs.stats)
+                log.debug(f'post-processing: {len(post.jobs)} jobs\n' + post.show())
+                if potoken.stats:
+                    log.debug('po tokens:\n' + potoken.show())
+                if queue.schedule():
+                    log.debug('scheduled:\n' + queue.show())
+                report = time.time() + 600
+
+            for url, state, took in registry.pop_ended():
+                queue.ended(url, state == registry.FAILED, took)
+
+            batches = {}  # proxy => [(ch, cfg), ...]
+
+            for url in queue.pop_due():
+                ch, cfg = by_url[url]
+
+                if registry.running(url):
+                    queue.hold(url)
+                    continue
+
+                # scheduled stream is close, recorder will wait for it
+                stream = queue.armed(url)
+                if stream is not None and cfg.recorder in ['dlp', 'yta']:
+                    start_recording(ch, cfg, args, channels, url=stream.url, wait=True)
+                    model.add(url, stream.ts)
                     continue
 
-                stream = None
+                registry.update(url, registry.CHECKING, priority=cfg.priority)
+                registry.candidate(url, probe.video_id(url))
 
-                match cfg['checker']:
-                    case 'str':
-                        stream = str_is_live(cfg['url'], cfg['proxy'], cfg['cookies'])
+                if cfg.checker == 'twb':
+                    batches.setdefault(cfg.proxy, []).append((ch, cfg))
+                    continue
+
+                checks[pool.submit(check, [cfg])] = [(ch, cfg)]
+
+            for batch in batches.values():
+                for i in range(0, len(batch), twitch.BATCH):
+                    items = batch[i : i + twitch.BATCH]
+                    future = pool.submit(check, [cfg for _, cfg in items])
+                    checks[future] = items
+
+            if not checks:
+                log.trace('nothing to check', states=registry.summary())
+                time.sleep(1)
+                continue
 
-                    case 'dlp':
-                        stream = dlp_is_live(cfg['url'], cfg['proxy'], cfg['cookies'])
+            done, _ = wait(checks, timeout=1, return_when=FIRST_COMPLETED)
+            results = []  # [(ch, cfg, stream), ...]
 
-                    case _:
-                        log.error(f'invalid checker: {cfg["checker"]}', cfg=cfg)
+            for future in done:
+                items = checks.pop(future)
+
+                try:
+                    streams = future.result()
+                except Exception as ex:
+                    log.exception(f'check failed: {ex}', items=items)
+                    streams = [None] * len(items)
+
+                for (ch, cfg), stream in zip(items, streams):
+                    if isinstance(stream, limit.Later):
+                        queue.later(cfg.url, stream.delay)
+                        registry.checked(cfg.url)
                         continue
 
-                if cfg['health']:
-                    if not stream:
-                        log.error(f'HEALTHCHECK FAILED: {cfg["url"]}')
+                    queue.done(cfg.url, stream)
+                    results.append((ch, cfg, stream))
 
-                        apobj = util.get_apobj(cfg['apprise'])
-                        apobj.notify(title='[HEALTHCHECK FAILED]', body=cfg['url'])
-                    else:
-                        log.debug(f'health ok: {ch}')
+            # same broadcast from several urls => higher priority records it
+            results.sort(key=lambda x: -x[1].priority)
 
-                elif stream:
-                    log.debug(f'start recording: {ch}', cfg=cfg)
+            for _, cfg, stream in results:
+                if cfg.url not in by_url:
+                    # removed from list while checking
+                    continue
 
-                    if cfg['delete']:
-                        config.parse(
-                            i=args.urls + args.input, args=args, cfg_to_del=cfg
-                        )
+                # list could be updated while checking
+                ch, cfg = by_url[cfg.url]
+                if ch not in channels:
+                    continue
 
-                    cfg['event'] = unload
-                    t = threading.Thread(
-                        target=record.main,
-                        name=cfg['url'],
-                        kwargs=cfg,
-                    )
-                    t.start()
+                if on_checked(ch, cfg, stream, args, channels):
+                    model.add(cfg.url)
+
+                if ch not in channels:
+                    queue.remove(cfg.url)
 
                 log.debug(
-                    '%s / %s | %s is streaming.'
-                    % (i, len(channels), threading.active_count() - 1),
-                    threads=get_threads(),
+                    '%s checking / %s | %s is streaming.'
+                    % (len(checks), len(channels), len(registry.active())),
+                    states=registry.summary(),
                 )
 
-                _sleep()
-
-                # rate-limit for single-item config
-                # if len(channels) == 1:
-                #    _sleep()
-
-            first_launch = False
+            # nothing started => back to idle / finished
+            for _, cfg, _ in results:
+                registry.checked(cfg.url)
 
     except KeyboardInterrupt:
-        unload.set()
+        supervisor.stop()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        if srv:
+            srv.stop()
         log.warning('stopping...')
 
-        while threading.active_count() > 1:
+        while registry.active() or post.running():
             time.sleep(1)
-            log.trace('stopping...', threads=get_threads())
+            log.trace('stopping...', active=registry.active(), post=post.running())
 
         return 0
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger as log
+
+from yk import procs
+
+# one event loop for every recording: recorder / chat / merge processes
+# are awaited (pidfd), blocking helpers run in a bounded executor
+
+WORKERS = 16  # default executor size
+
+loop: asyncio.AbstractEventLoop | None = None
+executor: ThreadPoolExecutor | None = None
+stopping = asyncio.Event()  # graceful shutdown, set via stop()
+tasks = set()  # running coroutines, as concurrent futures
+
+_lock = threading.Lock()
+
+
+def start(workers: int = WORKERS):
+    global loop, executor
+
+    with _lock:
+        if loop:
+            return loop
+
+        executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix='blk')
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(executor)
+
+        procs.setup(loop)
+        threading.Thread(target=loop.run_forever, name='loop', daemon=True).start()
+
+    log.debug(f'supervisor: started, {workers} blocking workers')
+    return loop
+
+
+def submit(coro):
+    # => concurrent.futures.Future, callable from any thread
+    f = asyncio.run_coroutine_threadsafe(coro, loop or start())
+
+    tasks.add(f)
+    f.add_done_callback(tasks.discard)
+    return f
+
+
+async def blocking(fn, *args, **kw):
+    # sync call in the executor, awaited by the loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(fn, *args, **kw)
+    )
+
+
+async def until_stop(aw):
+    # => True if aw is done, False on shutdown (aw keeps running)
+    task = asyncio.ensure_future(aw)
+    stop = asyncio.ensure_future(stopping.wait())
+
+    await asyncio.wait([task, stop], return_when=asyncio.FIRST_COMPLETED)
+    stop.cancel()
+
+    return task.done()
+
+
+def stop():
+    # recordings stop their processes and finish
+    if loop:
+        loop.call_soon_threadsafe(stopping.set)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import requests
+from loguru import logger as log
+from requests.adapters import HTTPAdapter
+
+from . import limit, supervisor
+from .probe import UA
+
+# youtube thumbnails: keep-alive sessions per proxy, every resolution at once,
+# streamed to a temp file + rename, conditional requests for known videos
+
+BLANKS = [
+    'https://i.ytimg.com/vi/%s/maxresdefault.jpg',
+    'https://i.ytimg.com/vi/%s/hqdefault.jpg',
+]  # best first
+
+TIMEOUT = (5, 15)  # connect, read
+CHUNK = 64 * 1024
+CACHE = 32  # thumbnails kept for 304 responses
+CACHE_MAX = 1024 * 1024  # bytes, bigger ones aren't cached
+
+sessions = {}  # proxy => requests.Session
+sessions_lock = threading.Lock()
+
+cache = OrderedDict()  # url => (etag, last-modified, bytes)
+cache_lock = threading.Lock()
+
+stats = {'fetched': 0, 'not_modified': 0, 'missing': 0, 'failed': 0}
+
+
+def session(proxy: str = ''):
+    with sessions_lock:
+        if proxy in sessions:
+            return sessions[proxy]
+
+        s = requests.Session()
+        s.headers.update({'User-Agent': UA})
+        s.mount('https://', HTTPAdapter(pool_maxsize=16))
+
+        if proxy:
+            s.proxies = {'http': proxy, 'https': proxy}
+
+        sessions[proxy] = s
+        return s
+
+
+def get(url: str, tmp: Path, proxy: str = ''):
+    # => True if tmp has the image (downloaded or cached + not modified)
+    with cache_lock:
+        cached = cache.get(url)
+
+    headers = {}
+    if cached:
+        etag, modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if modified:
+            headers['If-Modified-Since'] = modified
+
+    try:
+        with session(proxy).get(
+            url, stream=True, timeout=TIMEOUT, headers=headers
+        ) as r:
+            if r.status_code == 429:
+                limit.throttled(url, proxy)
+
+            if r.status_code == 304 and cached:
+                tmp.write_bytes(cached[2])
+                stats['not_modified'] += 1
+                return True
+
+            if r.status_code != 200:
+                stats['missing'] += 1
+                return False
+
+            data = bytearray()
+            with open(tmp, 'wb') as f:
+                for chunk in r.iter_content(CHUNK):
+                    f.write(chunk)
+                    if len(data) <= CACHE_MAX:
+                        data += chunk
+
+            etag = r.headers.get('ETag', '')
+            modified = r.headers.get('Last-Modified', '')
+
+    except (requests.RequestException, OSError) as ex:
+        stats['failed'] += 1
+        log.debug(f'thumbnail failed: {ex}', url=url, proxy=proxy)
+        tmp.unlink(missing_ok=True)
+        return False
+
+    stats['fetched'] += 1
+
+    if (etag or modified) and 0 < len(data) <= CACHE_MAX:
+        with cache_lock:
+            cache[url] = (etag, modified, bytes(data))
+            cache.move_to_end(url)
+            while len(cache) > CACHE:
+                cache.popitem(last=False)
+
+    return tmp.stat().st_size > 0
+
+
+def keep(path: Path, tmps: list, best: int | None):
+    # best temp file => path, the rest is removed
+    for i, tmp in enumerate(tmps):
+        if i == best:
+            os.replace(tmp, path)
+        else:
+            tmp.unlink(missing_ok=True)
+
+
+async def fetch(path: Path | str, video_id: str, proxy: str = ''):
+    # => url of the saved thumbnail, None if there is none
+    path = Path(path)
+    urls = [blank % video_id for blank in BLANKS]
+    tmps = [path.with_name(f'{path.stem}.{i}.jpg.tmp') for i in range(len(urls))]
+
+    for url in urls:
+        await limit.wait(url, proxy)
+
+    ok = await asyncio.gather(
+        *[supervisor.blocking(get, u, t, proxy) for u, t in zip(urls, tmps)]
+    )
+
+    best = next((i for i, x in enumerate(ok) if x), None)
+    await supervisor.blocking(keep, path, tmps, best)
+
+    if best is None:
+        log.warning(f'no thumbnail for {video_id}', proxy=proxy)
+        return None
+
+    return urls[best]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import threading
+
+import requests
+from loguru import logger as log
+
+from . import limit
+
+# batched live-check for twitch channels ('twb' checker),
+# one gql request answers for up to 100 logins
+
+GQL = os.getenv('YK_TWITCH_GQL', 'https://gql.twitch.tv/gql')
+CLIENT_ID = 'kimne78kx3ncx6brgo4mv6wki5h1ko'  # public web client
+BATCH = 100
+
+QUERY = """
+query($logins: [String!]) {
+    users(logins: $logins) {
+        login
+        stream { id title type createdAt }
+    }
+}
+"""
+
+RE_LOGIN = re.compile(r'^https?://(?:www\.|m\.)?twitch\.tv/(\w+)/?$', re.I)
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def login(url: str):
+    m = RE_LOGIN.match(url)
+    return m.group(1).lower() if m else None
+
+
+def session(proxy: str = ''):
+    with sessions_lock:
+        if proxy not in sessions:
+            s = requests.Session()
+            s.headers.update({'Client-ID': CLIENT_ID})
+
+            if proxy:
+                s.proxies = {'http': proxy, 'https': proxy}
+
+            sessions[proxy] = s
+
+        return sessions[proxy]
+
+
+def is_live(logins: list, proxy: str = '', timeout: int = 30):
+    # => {login: stream or None}
+    streams = dict.fromkeys(logins)
+
+    for i in range(0, len(logins), BATCH):
+        chunk = logins[i : i + BATCH]
+        limit.take(GQL, proxy)
+
+        r = session(proxy).post(
+            GQL,
+            json={'query': QUERY, 'variables': {'logins': chunk}},
+            timeout=timeout,
+        )
+        if r.status_code == 429:
+            limit.throttled(GQL, proxy)
+
+        r.raise_for_status()
+
+        data = r.json()
+        if data.get('errors'):
+            raise ValueError(f'gql errors: {data["errors"]}')
+
+        for user in data['data']['users']:
+            # null for banned / renamed users
+            if user and user['login'] in streams:
+                streams[user['login']] = user['stream']
+
+        log.trace(f'gql: {len(chunk)} logins', proxy=proxy)
+
+    return streams
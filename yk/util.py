@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 import json
 import re
+import threading
+import time
 import unicodedata
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -10,8 +12,7 @@ import apprise
 import requests
 from loguru import logger as log
 
-HQ_BLANK = 'https://i.ytimg.com/vi/%s/hqdefault.jpg'
-MAX_BLANK = 'https://i.ytimg.com/vi/%s/maxresdefault.jpg'
+THROTTLED = ['HTTP Error 429', 'Sign in to confirm']
 YTA_Q = [
     'audio_only',
     '144p',
@@ -30,6 +31,32 @@ YTA_Q = [
 ]
 
 
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.data = {}  # key => (expiration, value)
+        self.lock = threading.Lock()
+
+    def put(self, key, value, ttl: float | None = None):
+        with self.lock:
+            self.data[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+    def get(self, key, default=None):
+        with self.lock:
+            exp, value = self.data.get(key, (0, default))
+
+            if exp and exp < time.monotonic():
+                del self.data[key]
+                return default
+
+            return value
+
+    def pop(self, key, default=None):
+        with self.lock:
+            exp, value = self.data.pop(key, (0, default))
+            return value if not exp or exp >= time.monotonic() else default
+
+
 def get_apobj(payload: str):
     apobj = apprise.Apprise()
 
@@ -68,11 +95,6 @@ def con(lst, string):
     return any(k in str(string) for k in lst)
 
 
-def sum_mtime(files):
-    mtimes = [Path(f).stat().st_mtime for f in files if Path(f).is_file()]
-    return sum(mtimes)
-
-
 def str_cut(string: str, letters: int, postfix: str = '...'):
     return string[:letters] + (string[letters:] and postfix)
 
@@ -145,26 +167,8 @@ def pp(data: str):
 
 
 def pf(data: str):
-    return str(json.dumps(data, indent=4, ensure_ascii=False))
-
-
-def yt_dw_thumb(path: Path | str, video_id: str, proxy: str | None = None):
-    path = Path(path)
-    proxies = {'http': proxy, 'https': proxy} if proxy else None
-
-    for blank in [MAX_BLANK, HQ_BLANK]:
-        url = blank % video_id
-        try:
-            with requests.get(url, stream=True, proxies=proxies) as request:
-                if request.status_code == 200:
-                    with open(path, 'wb') as file:
-                        file.write(request.content)
-        except requests.RequestException as ex:
-            log.error(ex)
-            continue
-
-        if path.exists() and path.stat().st_size > 0:
-            return url
+    # default=str for non-json values (compiled regexes etc.)
+    return str(json.dumps(data, indent=4, ensure_ascii=False, default=str))
 
 
 def _http_cookies_regex(path: Path | str):
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from loguru import logger as log
+
+# list files watcher: inotify on the files and their dirs on linux,
+# stat() polling of the files that can't be watched (everywhere else)
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+IN_Q_OVERFLOW = 0x4000
+
+# parent dirs: editors often replace files via rename
+DIR_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE
+)  # fmt: skip
+
+# files themselves: in-place writes to a bind-mounted file (docker)
+# never show up in its parent dir
+FILE_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+
+POLL = 10  # seconds between stat() of files without a watch
+
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def signature(path: Path):
+    # inode + size + mtime_ns, a sum of mtimes can miss changes
+    try:
+        st = path.stat()
+        return st.st_ino, st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+class Watcher:
+    def __init__(self, files: list):
+        self.files = {Path(f).resolve(): f for f in files}
+        self.sigs = {}  # path => signature
+        self.fd = -1
+        self.dirs = {}  # wd => dir
+        self.wds = {}  # wd => file path
+        self.failed = set()  # dirs that can't be watched
+        self.first = True
+        self.polled = 0.0  # monotonic time of the last poll
+
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            self.fd = -1
+
+        if self.fd < 0:
+            log.debug('watching lists: polling')
+            return
+
+        self.watch()
+        log.debug(
+            'watching lists: inotify',
+            dirs=list(self.dirs.values()),
+            unwatched=[str(p) for p in self.unwatched()],
+        )
+
+    def add(self, path: Path, mask: int):
+        # => wd, -1 on errors
+        return self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+    def watch(self, paths: set | None = None):
+        # dirs without a watch, and paths (default: files without a watch),
+        # a replaced file is a new inode => new wd
+        watched = set(self.dirs.values())
+
+        for d in {p.parent for p in self.files} - watched - self.failed:
+            if not d.is_dir():
+                continue  # not created yet
+
+            wd = self.add(d, DIR_MASK)
+            if wd >= 0:
+                self.dirs[wd] = d
+                continue
+
+            # e.g. out of inotify watches, files there are polled
+            self.failed.add(d)
+            log.warning(
+                f'inotify: failed to watch {str(d)!r}', errno=ctypes.get_errno()
+            )
+
+        for path in self.unwatched() if paths is None else paths:
+            wd = self.add(path, FILE_MASK)
+            if wd >= 0:
+                self.wds[wd] = path
+
+    def unwatched(self):
+        # => [path, ...] without a file watch (missing files included)
+        watched = set(self.wds.values())
+        return [p for p in self.files if p not in watched]
+
+    def changed_sigs(self, paths):
+        # => {file, ...} with changed signature
+        r = set()
+
+        for path in paths:
+            sig = signature(path)
+            if self.sigs.get(path) != sig:
+                self.sigs[path] = sig
+                r.add(self.files[path])
+
+        return r
+
+    def poll(self):
+        return self.changed_sigs(self.files)
+
+    def read(self):
+        # => {path, ...} touched by inotify events
+        r = set()
+
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            if not buf:
+                break
+
+            off = 0
+            while off < len(buf):
+                wd, mask, _, size = EVENT.unpack_from(buf, off)
+                name = buf[off + EVENT.size : off + EVENT.size + size].rstrip(b'\0')
+                off += EVENT.size + size
+
+                if mask & IN_Q_OVERFLOW:
+                    r.update(self.files)
+                    continue
+
+                if wd in self.wds:
+                    # file itself, IN_IGNORED: inode is gone (deleted / replaced)
+                    path = self.wds[wd]
+                    if mask & IN_IGNORED:
+                        del self.wds[wd]
+                    r.add(path)
+                    continue
+
+                if mask & IN_IGNORED:
+                    # dir deleted / unmounted, watch it again when it's back
+                    d = self.dirs.pop(wd, None)
+                    r.update(p for p in self.files if p.parent == d)
+                    continue
+
+                d = self.dirs.get(wd)
+                if d is None or not name:
+                    continue
+
+                path = d / os.fsdecode(name)
+                if path in self.files:
+                    r.add(path)
+
+        if r:
+            # replaced / created files get a watch on their new inode
+            self.watch({p for p in r if p.exists()})
+
+        return r
+
+    def changed(self, timeout: float = 0):
+        # => {file, ...} changed since the last call (all of them on the first one)
+        if self.first:
+            self.first = False
+            self.polled = time.monotonic()
+            self.poll()
+            return set(self.files.values())
+
+        # touched files with a new signature, attrib-only / open+close don't
+        # count, files without a watch are polled from time to time
+        paths = set()
+
+        if self.fd >= 0:
+            select.select([self.fd], [], [], timeout)
+            paths = self.read()
+
+        now = time.monotonic()
+        if now - self.polled > POLL:
+            self.polled = now
+
+            if self.fd >= 0:
+                self.watch()
+                paths.update(self.unwatched())
+            else:
+                paths.update(self.files)
+
+        return self.changed_sigs(paths)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1